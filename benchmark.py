@@ -0,0 +1,130 @@
+# Benchmarks voor expression.py, draaien met: python benchmark.py
+import random
+import timeit
+
+from expression import scan, tokenize, Expression, Constant, Variable, NegNode, binaire_nodes, functie_nodes, parse_cache, ParseError
+
+
+# de oude tokenizer (split op spaties), als referentie voor de scanner
+def tokenize_split(string):
+    splitchars = list("+-*/(),")
+    tokenstring = []
+    for c in string:
+        if c in splitchars:
+            tokenstring.append(' %s ' % c)
+        else:
+            tokenstring.append(c)
+    tokens = ''.join(tokenstring).split()
+
+    ans = []
+    for t in tokens:
+        if len(ans) > 0 and t == ans[-1] == '*':
+            ans[-1] = '**'
+        else:
+            ans.append(t)
+    return ans
+
+# oude manier van getallen herkennen: float() proberen en de fout afvangen
+def classificeer_split(tokens):
+    soorten = []
+    for t in tokens:
+        try:
+            float(t)
+            soorten.append('getal')
+        except ValueError:
+            soorten.append('anders')
+    return soorten
+
+
+# een lange willekeurige formule van ongeveer n termen
+def lange_formule(n, seed=0):
+    rnd = random.Random(seed)
+    termen = []
+    for i in range(n):
+        keuze = rnd.randrange(4)
+        if keuze == 0:
+            termen.append('%d * x%d' % (rnd.randrange(100), i % 10))
+        elif keuze == 1:
+            termen.append('sin(x%d) ** 2' % (i % 10))
+        elif keuze == 2:
+            termen.append('%.3f / (y - %d)' % (rnd.random(), rnd.randrange(10)))
+        else:
+            termen.append('exp(-z) * %d' % rnd.randrange(1000))
+    return ' + '.join(termen)
+
+
+def benchmark_scanner():
+    print('tokenizer: split + float() tegen regex scanner')
+    for n in [10, 100, 1000, 10000]:
+        formule = lange_formule(n)
+        herhalingen = max(1, 20000 // n)
+        oud = timeit.timeit(lambda: classificeer_split(tokenize_split(formule)), number=herhalingen)
+        nieuw = timeit.timeit(lambda: scan(formule), number=herhalingen)
+        assert tokenize(formule) == tokenize_split(formule)
+        print('  %6d termen, %8d tekens: split %.4fs  scan %.4fs  (%.1fx)'
+              % (n, len(formule), oud, nieuw, oud / nieuw))
+
+
+# een willekeurige boom met ongeveer diepte diepte, met negaties, functies en alle binaire operatoren
+def willekeurige_boom(rnd, diepte):
+    if diepte == 0 or rnd.random() < 0.2:
+        if rnd.random() < 0.5:
+            return Constant(rnd.randrange(20))
+        return Variable(rnd.choice('xyz'))
+    keuze = rnd.random()
+    if keuze < 0.15:
+        return NegNode(willekeurige_boom(rnd, diepte - 1))
+    if keuze < 0.3:
+        functie = functie_nodes[rnd.choice(sorted(functie_nodes))]
+        return functie(willekeurige_boom(rnd, diepte - 1))
+    node = binaire_nodes[rnd.choice(sorted(binaire_nodes))]
+    return node(willekeurige_boom(rnd, diepte - 1), willekeurige_boom(rnd, diepte - 1))
+
+# de bomen met hun tekst, de tekst moet weer precies dezelfde boom opleveren
+def corpus(aantal, diepte=6, seed=0):
+    rnd = random.Random(seed)
+    return [(boom, str(boom)) for boom in (willekeurige_boom(rnd, diepte) for i in range(aantal))]
+
+# parsers zonder parse_cache, anders wordt alleen de cache gemeten
+parsers = [
+    ('fromString (RPN)', lambda tekst: Expression().fromString(tekst)),
+    ('shunting-yard', lambda tekst: Expression.parse(tekst)),
+    ('pratt', lambda tekst: Expression.parse(tekst, 'pratt')),
+]
+
+def benchmark_parsers(aantal=2000):
+    print('parsers: %d willekeurige formules' % aantal)
+    formules = corpus(aantal)
+    maxsize = parse_cache.maxsize
+    parse_cache.maxsize = 0
+    parse_cache.clear()
+    try:
+        referentie = None
+        for naam, parser in parsers:
+            # goed is: de boom wordt weer dezelfde tekst (x * (y * z) en x * y * z schrijven
+            # hetzelfde), en de boom is gelijk aan die van de eerste parser die alles goed had
+            bomen = []
+            fouten = 0
+            for boom, tekst in formules:
+                try:
+                    gelezen = parser(tekst)
+                except (ParseError, IndexError, KeyError):
+                    gelezen = None
+                if gelezen is None or str(gelezen) != tekst:
+                    fouten += 1
+                bomen.append(gelezen)
+            verschil = ''
+            if referentie is None and fouten == 0:
+                referentie = bomen
+            elif referentie is not None:
+                verschil = ', %d anders dan de referentie' % sum(a != b for a, b in zip(referentie, bomen))
+            tijd = min(timeit.repeat(lambda: [parser(tekst) for boom, tekst in formules],
+                                     number=1, repeat=5))
+            print('  %-18s %.4fs  (%.0f formules/s)  %d verkeerd%s'
+                  % (naam, tijd, aantal / tijd, fouten, verschil))
+    finally:
+        parse_cache.maxsize = maxsize
+
+if __name__ == '__main__':
+    benchmark_scanner()
+    benchmark_parsers()
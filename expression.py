@@ -1,51 +1,615 @@
 import math
 import sys
 import itertools
-import copy
+import operator
+import array
+import weakref
+import collections
+import re
+import concurrent.futures
+import os
+import struct
+import mmap
+import fractions
+import heapq
 
+# numpy is alleen nodig voor evaluate_array, de rest werkt ook zonder
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# fout bij het lezen van een formule, met de positie in de string waar het misging
+class ParseError(ValueError):
+
+    def __init__(self, melding, positie=None):
+        if positie is not None:
+            melding = "%s (positie %d)" % (melding, positie)
+        super(ParseError, self).__init__(melding)
+        self.positie = positie
+
+# Een token uit scan(): soort is 'getal', 'naam', 'operator', 'haakje' of 'komma',
+# tekst is het stuk van de string en positie de plek waar het begint
+Token = collections.namedtuple('Token', ['soort', 'tekst', 'positie'])
+
+# Een reguliere expressie voor alle tokens tegelijk. Elke match slaat eerst spaties over en
+# vult dan precies een groep, het nummer van die groep (lastindex) geeft de soort token.
+# Getallen mogen een exponent hebben (1e-3, 2.5E+4). Een teken dat nergens in past komt
+# in de laatste groep terecht en geeft een ParseError.
+token_patroon = re.compile(r"""\s*(?:
+    ((?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | ([A-Za-z_]\w*)
+  | (\*\*|[-+*/])
+  | ([()])
+  | (,)
+  | (\S))""", re.VERBOSE)
+token_soorten = [None, 'getal', 'naam', 'operator', 'haakje', 'komma', 'fout']
+
+# Lees de string in een keer van links naar rechts en geef de lijst met Tokens terug.
+def scan(string):
+    soorten = token_soorten
+    maak = tuple.__new__
+    tokens = []
+    for gevonden in token_patroon.finditer(string):
+        groep = gevonden.lastindex
+        if groep == 6:
+            raise ParseError("onbekend teken %r" % gevonden[groep], gevonden.start(groep))
+        tokens.append(maak(Token, (soorten[groep], gevonden[groep], gevonden.start(groep))))
+    return tokens
 
 def tokenize(string):
     #split a string into mathematical tokens
     #returns a list of numbers, operators, parantheses and commas
     #output will not contain spaces
-    
-    splitchars = list("+-*/(),")
+    return [token.tekst for token in scan(string)]
+
+# de waarde van een getal-token: een int als het kan, anders een float
+def tekst_naar_getal(tekst):
+    if tekst.isdigit():
+        return int(tekst)
+    return float(tekst)
+
+# de rekenkundige operaties per operatiesymbool, deze werken ook op numpy arrays
+bewerkingen = {'+': operator.add, '-': operator.sub, '*': operator.mul,
+               '/': operator.truediv, '**': operator.pow}
+
+# functies die een gecompileerde expressie bij naam mag aanroepen
+compile_functies = {'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+                    'exp': math.exp, 'log': math.log}
+
+# Een getal als sleutel voor een tabel. 0.0 en -0.0 (en 1 en 1.0) zijn gelijk volgens ==, maar
+# geven andere uitkomsten (1 / -0.0 is -inf), dus bij floats telt de exacte bitvorm.
+def getal_sleutel(waarde):
+    if isinstance(waarde, float):
+        return (type(waarde), waarde.hex())
+    return (type(waarde), waarde)
+
+# Hash-consing: gelijke (sub)expressies worden hetzelfde object, de boom wordt zo een DAG.
+# De tabel houdt de nodes niet zelf in leven. De sleutel van een samengestelde node bevat
+# de id's van de al geinterneerde kinderen; zolang de node bestaat, bestaan die kinderen ook.
+intern_tabel = weakref.WeakValueDictionary()
+
+# Geeft de gedeelde versie van expressie terug. Daarna zijn gelijke deelbomen hetzelfde
+# object, dus a == b is voor geinterneerde nodes meestal direct een 'is' vergelijking.
+def intern(expressie):
+    return postorder(expressie, interneer)
+
+# zoek de node op in de intern tabel, kinderen zijn de al geinterneerde kinderen.
+# Als hij er nog niet is wordt de node (met de geinterneerde kinderen) opgeslagen.
+def interneer(node, kinderen):
+    sleutel = node._internSleutel(kinderen)
+    gevonden = intern_tabel.get(sleutel)
+    if gevonden is None:
+        gevonden = node._vervangKinderen(kinderen)
+        intern_tabel[sleutel] = gevonden
+    return gevonden
 
-    # surround any splitchar by spaces
-    tokenstring = []
-    for c in string:
-        if c in splitchars:
-            tokenstring.append(' %s ' % c)
+# Post-order doorloop van een expressie zonder recursie, zodat ook hele diepe bomen werken.
+# functie(node, kinderwaarden) wordt aangeroepen als de waarden van alle kinderen van node
+# bekend zijn, en het resultaat voor de hele expressie wordt teruggegeven.
+# - gedeeld: een node die vaker voorkomt (DAG) wordt maar een keer uitgerekend. Met
+#   gedeeld=False wordt elk voorkomen apart bezocht, bv. voor de tape.
+# - overslaan(node) mag een waarde teruggeven voor de hele deelboom, dan wordt die deelboom
+#   niet verder bekeken. Bij None wordt de node gewoon bezocht.
+def postorder(expressie, functie, gedeeld=True, overslaan=None):
+    klaar = {} if gedeeld else None
+    waarden = []
+    # op de stack staat (node, None) voor een nieuwe node en (node, kinderen) voor een
+    # node waarvan de kinderen al op de stack gezet zijn
+    stack = [(expressie, None)]
+    while stack:
+        node, kinderen = stack.pop()
+        if kinderen is None:
+            if gedeeld and id(node) in klaar:
+                waarden.append(klaar[id(node)])
+                continue
+            if overslaan is not None:
+                waarde = overslaan(node)
+                if waarde is not None:
+                    waarden.append(waarde)
+                    if gedeeld:
+                        klaar[id(node)] = waarde
+                    continue
+            kinderen = node._kinderen()
+            if kinderen:
+                stack.append((node, kinderen))
+                # omgekeerd op de stack, zodat de linker zijde eerst aan de beurt is
+                for kind in reversed(kinderen):
+                    stack.append((kind, None))
+                continue
+            waarde = functie(node, ())
         else:
-            tokenstring.append(c)
-    tokenstring = ''.join(tokenstring)
-    #split on spaces - this gives us our tokens
-    tokens = tokenstring.split() 
-    
-    
-    ans = []
-    for t in tokens:
-        if len(ans) > 0 and t == ans[-1] == '*':
-            ans[-1] = '**'
+            # de waarden van de kinderen staan bovenaan, op volgorde
+            aantal = len(kinderen)
+            waarde = functie(node, waarden[-aantal:])
+            del waarden[-aantal:]
+        waarden.append(waarde)
+        if gedeeld:
+            klaar[id(node)] = waarde
+    return waarden[0]
+
+# voor Expression.variables: bereken en bewaar de vrije variabelen van node, en of
+# evaluate er niets meer aan kan vouwen (zie _gevouwenKnoop)
+def _vrijeVariabelen(node, kinderen):
+    vrij = node._vrijKnoop(kinderen)
+    node._vrij = vrij
+    node._gevouwen = node._gevouwenKnoop()
+    return vrij
+
+# Evalueer het resultaat van cse(): eerst de tijdelijke variabelen op volgorde, dan de
+# gereduceerde expressie. Zo wordt elke gedeelde deelboom maar een keer uitgerekend.
+def evaluate_cse(gereduceerd, tijdelijk, variabelen={}):
+    waarden = dict(variabelen)
+    for variabele, deelboom in tijdelijk:
+        waarde = deelboom.evaluate(waarden)
+        if isinstance(waarde, Constant):
+            waarde = waarde.value
+        waarden[variabele.teken] = waarde
+    return gereduceerd.evaluate(waarden)
+
+# Een begrensde LRU cache met tellers (hits, misses), gebruikt door parse_cache, EvaluateCache,
+# specialize en derivative. get geeft None als de sleutel er niet in staat. Met maxsize None is
+# de cache onbegrensd, met maxsize 0 wordt er niets bewaard. Een sleutel die niet gehasht kan
+# worden (bv. met een lijst als waarde van een variabele) gaat buiten de cache om: get geeft
+# None en put doet niets.
+# get_node en put_node zijn voor sleutels op een node: de sleutel is id(node) met de rest, en
+# de node wordt naast de waarde bewaard, zodat zijn id niet hergebruikt kan worden zolang hij
+# in de cache staat.
+class LRUCache():
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.cache = collections.OrderedDict()
+
+    # het aantal opgeslagen sleutels
+    def __len__(self):
+        return len(self.cache)
+
+    def get(self, sleutel):
+        try:
+            gevonden = self.cache.get(sleutel)
+        except TypeError:
+            gevonden = None
+        if gevonden is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.cache.move_to_end(sleutel)
+        return gevonden
+
+    def put(self, sleutel, waarde):
+        if self.maxsize is not None and self.maxsize <= 0:
+            return
+        try:
+            self.cache[sleutel] = waarde
+        except TypeError:
+            return
+        if self.maxsize is not None and len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def get_node(self, node, sleutel=None):
+        gevonden = self.get((id(node), sleutel))
+        if gevonden is None:
+            return None
+        return gevonden[1]
+
+    def put_node(self, node, sleutel, waarde):
+        self.put((id(node), sleutel), (node, waarde))
+
+    # alles weggooien en de tellers op nul zetten
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+# De waarden van de variabelen van een expressie (vrij, zie variables()) als deel van een
+# sleutel voor LRUCache. {'x': 2, 'y': 5} en {'x': 2} geven voor x + 1 dus dezelfde sleutel.
+def waarden_sleutel(variabelen, vrij):
+    return tuple(sorted((teken, getal_sleutel(waarde)) for teken, waarde in variabelen.items() if teken in vrij))
+
+# Een begrensde LRU cache rond evaluate, voor als dezelfde expressie vaak met dezelfde
+# waarden wordt geevalueerd (bv. in numSolver en findRoot). Gebruik:
+#     cache = EvaluateCache(maxsize=1024)
+#     cache.evaluate(expr, {'x': 2})
+# De sleutel is de node zelf (op identiteit) met alleen de waarden van variabelen die in
+# de expressie voorkomen, zie waarden_sleutel.
+# Nodes worden als onveranderlijk behandeld: wie een node toch aanpast roept invalidate aan.
+class EvaluateCache(LRUCache):
+
+    # evaluate met de cache ervoor
+    def evaluate(self, expressie, variabelen={}):
+        sleutel = waarden_sleutel(variabelen, expressie.variables())
+        uitkomst = self.get_node(expressie, sleutel)
+        if uitkomst is None:
+            uitkomst = expressie.evaluate(variabelen)
+            self.put_node(expressie, sleutel, uitkomst)
+        return uitkomst
+
+    # Gooi de opgeslagen resultaten van expressie weg, of alles als expressie None is
+    def invalidate(self, expressie=None):
+        if expressie is None:
+            self.cache.clear()
+            return
+        for sleutel in [s for s in self.cache if s[0] == id(expressie)]:
+            del self.cache[sleutel]
+
+# De getalwaarde van expressie voor de gegeven variabelen, via cache als die er is
+def getalwaarde(expressie, variabelen, cache=None):
+    if cache is None:
+        return expressie.evaluate(variabelen).constantvalue()
+    return cache.evaluate(expressie, variabelen).constantvalue()
+
+# Een duaal getal waarde + afgeleide * eps met eps ** 2 = 0. Rekenen met duale getallen geeft
+# tegelijk de waarde en de afgeleide (forward mode). waarde en afgeleide mogen ook numpy arrays
+# zijn. Gewone getallen doen mee als getallen met afgeleide 0.
+class Dual():
+    __slots__ = ('waarde', 'afgeleide')
+
+    # een numpy array links van een Dual (array * Dual) geeft NotImplemented terug, zodat
+    # Python de omgekeerde bewerking van Dual gebruikt in plaats van de Dual als object te zien
+    __array_ufunc__ = None
+
+    def __init__(self, waarde, afgeleide=0):
+        self.waarde = waarde
+        self.afgeleide = afgeleide
+
+    def __repr__(self):
+        return 'Dual(%r, %r)' % (self.waarde, self.afgeleide)
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.waarde + other.waarde, self.afgeleide + other.afgeleide)
+        return Dual(self.waarde + other, self.afgeleide)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.waarde - other.waarde, self.afgeleide - other.afgeleide)
+        return Dual(self.waarde - other, self.afgeleide)
+
+    def __rsub__(self, other):
+        return Dual(other - self.waarde, -self.afgeleide)
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.waarde * other.waarde,
+                        self.afgeleide * other.waarde + self.waarde * other.afgeleide)
+        return Dual(self.waarde * other, self.afgeleide * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            waarde = self.waarde / other.waarde
+            return Dual(waarde, (self.afgeleide - waarde * other.afgeleide) / other.waarde)
+        return Dual(self.waarde / other, self.afgeleide / other)
+
+    def __rtruediv__(self, other):
+        waarde = other / self.waarde
+        return Dual(waarde, -waarde * self.afgeleide / self.waarde)
+
+    def __neg__(self):
+        return Dual(-self.waarde, -self.afgeleide)
+
+    # (a + da) ** (b + db): b * a ** (b-1) * da + a ** b * log(a) * db
+    def __pow__(self, other):
+        if not isinstance(other, Dual):
+            # alleen een gewoon getal 0, een array van exponenten gaat door de gewone regel
+            if isinstance(other, (int, float)) and other == 0:
+                return Dual(self.waarde ** other, 0 * self.afgeleide)
+            return Dual(self.waarde ** other, other * self.waarde ** (other - 1) * self.afgeleide)
+        waarde = self.waarde ** other.waarde
+        afgeleide = other.waarde * self.waarde ** (other.waarde - 1) * self.afgeleide
+        return Dual(waarde, afgeleide + waarde * _log(self.waarde) * other.afgeleide)
+
+    def __rpow__(self, other):
+        waarde = other ** self.waarde
+        return Dual(waarde, waarde * _log(other) * self.afgeleide)
+
+    # vergelijken gaat op de waarde
+    def __eq__(self, other):
+        return self.waarde == (other.waarde if isinstance(other, Dual) else other)
+
+    def __lt__(self, other):
+        return self.waarde < (other.waarde if isinstance(other, Dual) else other)
+
+    def __gt__(self, other):
+        return self.waarde > (other.waarde if isinstance(other, Dual) else other)
+
+    __hash__ = None
+
+# log van een getal of een numpy array
+def _log(x):
+    if np is not None and isinstance(x, np.ndarray):
+        return np.log(x)
+    return math.log(x)
+
+# De functies sin, cos, tan, exp en log voor duale getallen, met de functies uit module
+# (math of numpy) voor de waarden. Gewone getallen gaan direct naar module.
+class DualMath():
+
+    def __init__(self, module=math):
+        self.module = module
+
+    def sin(self, x):
+        if not isinstance(x, Dual):
+            return self.module.sin(x)
+        return Dual(self.module.sin(x.waarde), self.module.cos(x.waarde) * x.afgeleide)
+
+    def cos(self, x):
+        if not isinstance(x, Dual):
+            return self.module.cos(x)
+        return Dual(self.module.cos(x.waarde), -self.module.sin(x.waarde) * x.afgeleide)
+
+    def tan(self, x):
+        if not isinstance(x, Dual):
+            return self.module.tan(x)
+        waarde = self.module.tan(x.waarde)
+        return Dual(waarde, (1 + waarde * waarde) * x.afgeleide)
+
+    def exp(self, x):
+        if not isinstance(x, Dual):
+            return self.module.exp(x)
+        waarde = self.module.exp(x.waarde)
+        return Dual(waarde, waarde * x.afgeleide)
+
+    def log(self, x):
+        if not isinstance(x, Dual):
+            return self.module.log(x)
+        return Dual(self.module.log(x.waarde), x.afgeleide / x.waarde)
+
+dual_math = DualMath(math)
+
+# Reverse mode over een of meer expressies tegelijk: de som van gewicht * gradient van elke
+# expressie, als {variabele: waarde}. De expressies komen samen in een lijst nodes in post-order
+# (een gedeelde node maar een keer), dan een keer heen voor de waarden en een keer terug voor de
+# afgeleiden (adjuncten). De kosten hangen niet af van het aantal variabelen.
+def _omgekeerd(expressies, gewichten, variabelen, m):
+    nodes = []
+    kinderen = []
+    indices = {}
+    def voegToe(node, kind):
+        indices[id(node)] = len(nodes)
+        nodes.append(node)
+        kinderen.append(kind)
+        return len(nodes) - 1
+    wortels = [postorder(expressie, voegToe, overslaan=lambda node: indices.get(id(node)))
+               for expressie in expressies]
+
+    waarden = []
+    for node, kind in zip(nodes, kinderen):
+        if isinstance(node, Variable):
+            if node.teken not in variabelen:
+                raise ValueError("variabele '%s' heeft geen waarde gekregen" % node.teken)
+            waarden.append(variabelen[node.teken])
         else:
-            ans.append(t)
-            
-    return ans
-# check if a string represents a numeric value
-def isnumber(string):
-    try:
-        float(string)
-        return True
-    except ValueError:
-        return False
+            waarden.append(node._rekenKnoop([waarden[k] for k in kind], m))
 
-# check if a string represents an integer value        
-def isint(string):
-    try:
-        int(string)
-        return True
-    except ValueError:
-        return False
+    # de nodes in omgekeerde volgorde: alle ouders van een node zijn dan al geweest
+    adjuncten = [0] * len(nodes)
+    for wortel, gewicht in zip(wortels, gewichten):
+        adjuncten[wortel] = adjuncten[wortel] + gewicht
+    gradient = {}
+    for i in range(len(nodes) - 1, -1, -1):
+        node = nodes[i]
+        if kinderen[i]:
+            partieel = node._partieel([waarden[k] for k in kinderen[i]], waarden[i], m)
+            for kind, afgeleide in zip(kinderen[i], partieel):
+                adjuncten[kind] = adjuncten[kind] + adjuncten[i] * afgeleide
+        elif isinstance(node, Variable):
+            gradient[node.teken] = gradient.get(node.teken, 0) + adjuncten[i]
+    return gradient
+
+# Jacobiaan maal vector voor een lijst expressies: de afgeleide van elke expressie in de
+# richting richting ({variabele: getal}), in een keer heen met duale getallen. Gedeelde
+# deelbomen tussen de expressies worden maar een keer uitgerekend.
+def jvp(expressies, variabelen, richting):
+    duaal = {}
+    for teken, waarde in variabelen.items():
+        duaal[teken] = Dual(waarde, richting[teken]) if teken in richting else waarde
+    klaar = {}
+    def reken(node, kinderen):
+        if isinstance(node, Variable):
+            if node.teken not in duaal:
+                raise ValueError("variabele '%s' heeft geen waarde gekregen" % node.teken)
+            waarde = duaal[node.teken]
+        else:
+            waarde = node._rekenKnoop(kinderen, dual_math)
+        klaar[id(node)] = waarde
+        return waarde
+    uitkomst = []
+    for expressie in expressies:
+        waarde = postorder(expressie, reken, overslaan=lambda node: klaar.get(id(node)))
+        uitkomst.append(waarde.afgeleide if isinstance(waarde, Dual) else 0)
+    return uitkomst
+
+# Vector maal Jacobiaan voor een lijst expressies: sum(gewicht * gradient van expressie), als
+# {variabele: waarde}, met een keer terug over alle expressies samen.
+def vjp(expressies, variabelen, gewichten):
+    return _omgekeerd(expressies, gewichten, variabelen, math)
+
+# Gauss-Kronrod met 15 punten (en de 7 punt Gauss regel erin voor de foutschatting): de
+# punten op [-1, 1] van het midden naar buiten en hun gewichten
+kronrod_punten = [0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+                  0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+                  0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+                  0.207784955007898467600689403773245, 0.0]
+kronrod_gewichten = [0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                     0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                     0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                     0.204432940075298892414161999234649, 0.209482141084727828012999174891714]
+gauss_gewichten = [0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+                   0.381830050505118944950369775488975, 0.417959183673469387755102040816327]
+
+# De integraal van f over [a, b] met 15 punten en het verschil met de 7 punt Gauss regel als fout
+def _kronrod(f, a, b):
+    midden = (a + b) / 2
+    half = (b - a) / 2
+    fmidden = f(midden)
+    kronrod = fmidden * kronrod_gewichten[7]
+    gauss = fmidden * gauss_gewichten[3]
+    for j in range(7):
+        stap = half * kronrod_punten[j]
+        paar = f(midden - stap) + f(midden + stap)
+        kronrod += kronrod_gewichten[j] * paar
+        if j % 2 == 1:
+            gauss += gauss_gewichten[j // 2] * paar
+    return kronrod * half, abs((kronrod - gauss) * half)
+
+# De gewichten voor aantal stukken van lengte stap: trapezium h/2, h, .., h, h/2 en
+# Simpson h/3 * (1, 4, 2, 4, .., 4, 1)
+def _roostergewichten(aantal, stap, regel):
+    if regel == 'trapezium':
+        gewichten = [stap] * (aantal + 1)
+        gewichten[0] = gewichten[-1] = stap / 2
+    elif regel == 'simpson':
+        gewichten = [(2 if i % 2 == 0 else 4) * stap / 3 for i in range(aantal + 1)]
+        gewichten[0] = gewichten[-1] = stap / 3
+    else:
+        raise ValueError("onbekende regel: %r" % regel)
+    return gewichten
+
+# Herhaald evalueren van een expressie waarvan steeds maar een paar variabelen veranderen.
+# De (geinternde) boom wordt een platte lijst nodes in post-order; elke node weet zijn ouders
+# en onthoudt zijn laatste waarde. set() maakt alleen de nodes boven de variabele "vuil" en
+# value() rekent alleen die opnieuw uit, dus bij een boom is een update ongeveer O(diepte).
+#     inc = IncrementalEvaluator(expr, {'x': 1, 'a': 2, 'b': 3})
+#     inc.set('x', 1.5)
+#     inc.value()
+class IncrementalEvaluator():
+
+    def __init__(self, expressie, variabelen={}):
+        self.expressie = expressie
+        # per node: de operatie, de indices van de kinderen en van de ouders
+        self.operaties = []
+        self.kinderen = []
+        self.ouders = []
+        self.waarden = []
+        # per variabele de index van zijn node
+        self.plaatsen = {}
+        postorder(intern(expressie), self._voegToe)
+        # nodes die opnieuw uitgerekend moeten worden, in het begin alles behalve constanten
+        self.vuil = set(i for i, kinderen in enumerate(self.kinderen) if kinderen)
+        # het aantal nodes dat de laatste value() opnieuw uitrekende
+        self.herberekend = 0
+        self.update(variabelen)
+
+    # een node achteraan de lijst zetten, kinderen zijn de indices van zijn kinderen
+    def _voegToe(self, node, kinderen):
+        index = len(self.operaties)
+        self.kinderen.append(tuple(kinderen))
+        self.ouders.append([])
+        for kind in kinderen:
+            self.ouders[kind].append(index)
+        if isinstance(node, Constant):
+            self.operaties.append(None)
+            self.waarden.append(node.value)
+        elif isinstance(node, Variable):
+            self.operaties.append(None)
+            self.waarden.append(None)
+            self.plaatsen[node.teken] = index
+        else:
+            self.operaties.append(node.operatie)
+            self.waarden.append(None)
+        return index
+
+    # de variabelen waar de expressie van afhangt
+    def variables(self):
+        return set(self.plaatsen)
+
+    # geef variabele teken een nieuwe waarde, de nodes erboven moeten opnieuw
+    def set(self, teken, waarde):
+        index = self.plaatsen.get(teken)
+        if index is None:
+            # de expressie hangt niet van deze variabele af
+            return
+        if self.waarden[index] == waarde and type(self.waarden[index]) is type(waarde):
+            return
+        self.waarden[index] = waarde
+        stack = list(self.ouders[index])
+        while stack:
+            ouder = stack.pop()
+            if ouder not in self.vuil:
+                self.vuil.add(ouder)
+                stack.extend(self.ouders[ouder])
+
+    def update(self, variabelen):
+        for teken, waarde in variabelen.items():
+            self.set(teken, waarde)
+
+    # De waarde van de expressie, als getal. Alle variabelen moeten een waarde hebben.
+    def value(self):
+        for teken, index in self.plaatsen.items():
+            if self.waarden[index] is None:
+                raise ValueError("variabele '%s' heeft geen waarde gekregen" % teken)
+        waarden = self.waarden
+        # post-order indices: de kinderen komen altijd voor hun ouders
+        volgorde = sorted(self.vuil)
+        for index in volgorde:
+            waarden[index] = self.operaties[index](*[waarden[kind] for kind in self.kinderen[index]])
+            self.vuil.discard(index)
+        self.herberekend = len(volgorde)
+        return waarden[-1]
+
+# De tabellen voor de parser. order_op (precedence en associativiteit per operator) en
+# functie_nodes worden onderaan de module gevuld, als de node classes bestaan.
+operatoren = frozenset(['+', '-', '*', '/', '**'])
+operatoren_negatie = operatoren | {'~'}
+# na deze tokens is een minteken een negatie
+voor_negatie = operatoren | {'('}
+# order_op index 0 is order, index 1 is associativity (0=left, 1=right)
+order_op = {}
+functie_nodes = {}
+
+# De LRU cache van fromString en Expression.parse: string -> (boom, RPN lijst of None)
+# Statistieken staan in parse_cache.hits en parse_cache.misses, legen met parse_cache.clear()
+parse_cache = LRUCache()
+
+# de LRU cache van Expression.specialize: (expressie, waarden, free) -> functie
+specialize_cache = LRUCache(maxsize=256)
+
+# opcodes voor de tape (zie de class Tape onderaan)
+OP_CONST = 0
+OP_VAR = 1
+OP_NEG = 2
+# binaire operaties en functies krijgen een opcode op volgorde
+tape_opcodes = {'+': 3, '-': 4, '*': 5, '/': 6, '**': 7,
+                'sin': 8, 'cos': 9, 'tan': 10, 'exp': 11, 'log': 12}
+
+# de kop van een expressie in binaire vorm, zie Tape.dumps en ExpressionLibrary
+TAPE_MAGIC = b'EXPR'
+LIBRARY_MAGIC = b'EXPL'
+TAPE_VERSIE = 1
+tape_kop = struct.Struct('<4sB3xIII')
+
+# De RPN lijst van de laatste fromString per object (op id), zie Expression.output. Alleen het
+# object van Expression().fromString(...) krijgt er een, de nodes zelf hoeven er geen plek voor
+# te hebben. weakref.finalize haalt de lijst weg als het object verdwijnt.
+rpn_uitvoer = {}
 
 class Expression():
     #A mathematical expression, represented as an expression tree
@@ -54,6 +618,235 @@ class Expression():
     # - __str__(): return a string representation of the Expression.
     # - __eq__(other): tree-equality, check if other represents the same expression tree.
 
+    # Alle nodes gebruiken __slots__ in plaats van een __dict__: alleen de kinderen of de
+    # waarde worden per node opgeslagen, vaste gegevens (op_symbol, precedence, ...) staan
+    # op de class. __weakref__ is nodig voor de intern tabel en voor output.
+    # _vrij onthoudt de vrije variabelen van de deelboom, zie variables(), _gevouwen of evaluate
+    # de deelboom zonder ingevulde variabelen ongewijzigd laat.
+    __slots__ = ('__weakref__', '_vrij', '_gevouwen')
+
+    # De operaties hieronder lopen de boom door met postorder() in plaats van met recursie.
+    # Een node levert daarvoor alleen het werk voor zichzelf:
+    # - _kinderen() en _vervangKinderen(kinderen)
+    # - _zelfdeKnoop(other) en _hashKnoop(kinderhashes) voor __eq__ en __hash__
+    # - _stukken() voor __str__: tekst en kinderen in de volgorde van afdrukken
+    # - _evalueer(kinderen, variabelen), _difKnoop(afgeleiden), _arrayKnoop, _codeKnoop, _tapeKnoop
+    # - _vrijKnoop(kinderen) voor variables()
+    # - _afgeleideKnoop(afgeleiden, variabele) voor derivative(): de afgeleide naar variabele
+    # - _rekenKnoop(kinderen, m) en _partieel(kinderen, waarde, m) voor gradient(): de waarde van
+    #   de node en de afgeleiden naar elk kind, met de functies (sin, log, ...) uit module m
+
+    # gelijkheid van twee bomen: de paren nodes gaan op een stack
+    def __eq__(self, other):
+        stack = [(self, other)]
+        while stack:
+            links, rechts = stack.pop()
+            if links is rechts:
+                continue
+            if not links._zelfdeKnoop(rechts):
+                return False
+            stack.extend(zip(links._kinderen(), rechts._kinderen()))
+        return True
+
+    # hash die past bij __eq__
+    def __hash__(self):
+        return postorder(self, lambda node, kinderen: node._hashKnoop(kinderen))
+
+    # tostring: de stukken van elke node worden van links naar rechts uitgeschreven
+    def __str__(self):
+        uitvoer = []
+        stack = [self]
+        while stack:
+            stuk = stack.pop()
+            if isinstance(stuk, str):
+                uitvoer.append(stuk)
+            else:
+                stack.extend(reversed(stuk._stukken()))
+        return ''.join(uitvoer)
+
+    # Evaluatie: variabelen die in de dictionary staan worden ingevuld. Als alles bekend is
+    # komt er een Constant uit, anders een (vereenvoudigde) expressie.
+    # Een deelboom waarin geen variabele ingevuld wordt en niets meer te vouwen valt, komt
+    # ongewijzigd (dezelfde nodes) terug in plaats van opnieuw opgebouwd te worden.
+    def evaluate(self, variabelen={}):
+        if not variabelen:
+            return postorder(self, lambda node, kinderen: node._evalueer(kinderen, variabelen))
+        self.variables()
+        return postorder(self, lambda node, kinderen: node._evalueer(kinderen, variabelen),
+                         overslaan=lambda node: node if node._gevouwen and node._vrij.isdisjoint(variabelen) else None)
+
+    # De namen van de variabelen in de expressie, als frozenset. Het resultaat wordt per node
+    # bewaard, een deelboom die al bekend is wordt niet nog eens doorgelopen.
+    def variables(self):
+        vrij = getattr(self, '_vrij', None)
+        if vrij is None:
+            vrij = postorder(self, _vrijeVariabelen, overslaan=lambda node: getattr(node, '_vrij', None))
+        return vrij
+
+    # de vrije variabelen van een node zijn die van zijn kinderen samen
+    def _vrijKnoop(self, kinderen):
+        if len(kinderen) == 1:
+            return kinderen[0]
+        links, rechts = kinderen
+        # de meeste tijd is een van de twee al groot genoeg, dan wordt die set gedeeld
+        if links >= rechts:
+            return links
+        if rechts >= links:
+            return rechts
+        return links | rechts
+
+    # Of evaluate deze node (met gevouwen kinderen) zo laat: niet als alle kinderen constanten
+    # zijn, en niet met een 0 of 1 eronder, die haalt _evalueer weg. Voor een 1 bij + of - is
+    # dat te voorzichtig, dan wordt de node alleen opnieuw doorgelopen.
+    def _gevouwenKnoop(self):
+        kinderen = self._kinderen()
+        if all(isinstance(kind, Constant) for kind in kinderen):
+            return False
+        for kind in kinderen:
+            if not kind._gevouwen or (isinstance(kind, Constant) and kind.value in (0, 1)):
+                return False
+        return True
+
+    # Differentiatie. leaf wordt alleen gebruikt door Constant en Variable
+    def dif(self, leaf=False):
+        return postorder(self, lambda node, afgeleiden: node._difKnoop(afgeleiden))
+
+    # Vereenvoudigen met herschrijfregels (zie simplify_regels) tot er geen regel meer iets
+    # verandert. Een herschrijving telt alleen als de deelboom er kleiner van wordt, zo kan de
+    # boom nooit groeien en stopt het altijd. Elke regel die iets doet wordt gemeld met
+    # log(naam, nodes voor, nodes na), bv. expr.simplify(log=print); de aantallen zijn die van
+    # de hele expressie (zoals aantal_nodes ze telt) voor en na de herschrijving.
+    # Een ketting als a + b - c + d wordt alleen vanaf de bovenste + of - verzameld (zie
+    # ketting_regels), en de grootte van elke deelboom wordt onthouden in plaats van steeds
+    # opnieuw geteld, zo blijft een pass lineair in de grootte van de boom.
+    def simplify(self, log=None):
+        veranderd = True
+        huidig = self
+        while veranderd:
+            veranderd = False
+            keer, binnen = _aantalKeer(huidig, ketting_regels)
+            totaal = aantal_nodes(huidig)
+            # per nieuwe node (op id) het paar (node, aantal nodes); de node zelf houdt het id bezet
+            grootte = {}
+            def bekend(node):
+                paar = grootte.get(id(node))
+                return None if paar is None else paar[1]
+            def herschrijf(node, kinderen):
+                nonlocal veranderd, totaal
+                origineel = node
+                node = node._vervangKinderen(kinderen)
+                voor = 1 + sum(grootte[id(kind)][1] for kind in kinderen)
+                for naam, regel in simplify_regels:
+                    if id(origineel) in binnen and regel in ketting_regels:
+                        continue
+                    nieuw = regel(node)
+                    if nieuw is None:
+                        continue
+                    na = postorder(nieuw, lambda node, kinderen: 1 + sum(kinderen), overslaan=bekend)
+                    if na >= voor:
+                        continue
+                    # een gedeelde node komt meer dan een keer in de boom voor
+                    verschil = (na - voor) * keer[id(origineel)]
+                    if log is not None:
+                        log(naam, totaal, totaal + verschil)
+                    totaal += verschil
+                    veranderd = True
+                    grootte[id(nieuw)] = (nieuw, na)
+                    return nieuw
+                grootte[id(node)] = (node, voor)
+                return node
+            huidig = postorder(huidig, herschrijf)
+        return huidig
+
+    # De afgeleide naar variabele, order keer afgeleid, bv. expr.derivative('x', order=2).
+    # Anders dan dif() is de variabele expliciet. Alle tussenstappen delen hun deelbomen
+    # (de uitkomst is een geinterneerde DAG) en elke (node, variabele) wordt maar een keer
+    # afgeleid, zo groeit de n-de afgeleide niet exponentieel. geheugen is een LRUCache met de
+    # al bekende afgeleiden, die kan gedeeld worden tussen aanroepen (zoals hessian doet).
+    def derivative(self, variabele, order=1, geheugen=None):
+        if geheugen is None:
+            geheugen = LRUCache(maxsize=None)
+        uitkomst = self
+        for i in range(order):
+            uitkomst = _afgeleide(uitkomst, variabele, geheugen)
+        return uitkomst
+
+    # De Hessiaan: een lijst met rijen, hessian(['x', 'y'])[0][1] is de afgeleide naar x en
+    # dan naar y. De eerste afgeleiden en alle tussenstappen worden gedeeld, en omdat de matrix
+    # symmetrisch is wordt alleen de bovenste helft uitgerekend.
+    def hessian(self, variabelen):
+        geheugen = LRUCache(maxsize=None)
+        eerste = [self.derivative(variabele, 1, geheugen) for variabele in variabelen]
+        matrix = [[None] * len(variabelen) for variabele in variabelen]
+        for i, afgeleide in enumerate(eerste):
+            for j in range(i, len(variabelen)):
+                matrix[i][j] = matrix[j][i] = afgeleide.derivative(variabelen[j], 1, geheugen)
+        return matrix
+
+    # De gradient in een punt: {variabele: partiele afgeleide} voor alle variabelen in de
+    # expressie, met reverse mode automatische differentiatie. Een keer heen om alle waarden uit
+    # te rekenen en een keer terug om de afgeleiden (adjuncten) naar de kinderen door te geven,
+    # dus de kosten hangen niet af van het aantal variabelen. Alle variabelen moeten een waarde hebben.
+    def gradient(self, variabelen, m=math):
+        return _omgekeerd([self], [1], variabelen, m)
+
+    # Hessiaan maal vector zonder de Hessiaan te maken: {variabele: (H * richting)[variabele]}.
+    # Forward over reverse: gradient() met duale getallen x + richting * eps als invoer geeft
+    # in de afgeleiden van de uitkomst precies H * richting. Dat kost een paar evaluaties, ook
+    # bij honderden variabelen. Variabelen die niet in richting staan hebben richting 0.
+    def hvp(self, variabelen, richting):
+        duaal = {}
+        for teken, waarde in variabelen.items():
+            duaal[teken] = Dual(waarde, richting[teken]) if teken in richting else waarde
+        uitkomst = {}
+        for teken, afgeleide in self.gradient(duaal, dual_math).items():
+            uitkomst[teken] = afgeleide.afgeleide if isinstance(afgeleide, Dual) else 0
+        return uitkomst
+
+    # De waarde en de afgeleide naar variabele in een punt, in een keer door de boom met
+    # duale getallen en zonder nieuwe Expression objecten, bv. voor een Newton stap:
+    #     f, df = expr.value_and_derivative('x', {'x': 1.5, 'a': 2})
+    def value_and_derivative(self, variabele, variabelen):
+        uitkomst = self._dualeWaarde(variabele, variabelen, dual_math)
+        if isinstance(uitkomst, Dual):
+            return uitkomst.waarde, uitkomst.afgeleide
+        return uitkomst, 0
+
+    # Hetzelfde voor numpy arrays (zoals evaluate_array), geeft twee arrays terug
+    def value_and_derivative_array(self, variabele, variabelen):
+        if np is None:
+            raise ImportError("value_and_derivative_array heeft numpy nodig")
+        arrays = {}
+        for teken, waarde in variabelen.items():
+            arrays[teken] = np.asarray(waarde, dtype=float)
+        uitkomst = self._dualeWaarde(variabele, arrays, DualMath(np))
+        if isinstance(uitkomst, Dual):
+            waarde, afgeleide = uitkomst.waarde, uitkomst.afgeleide
+        else:
+            waarde, afgeleide = uitkomst, 0
+        waarde = np.asarray(waarde, dtype=float)
+        afgeleide = np.asarray(afgeleide, dtype=float)
+        # een deel dat niet van variabele afhangt kan een gewoon getal zijn gebleven, net als bij
+        # evaluate_array worden beide zo groot als de invoer
+        vorm = np.broadcast_shapes(waarde.shape, *[array.shape for array in arrays.values()])
+        return np.broadcast_to(waarde, vorm).copy(), np.broadcast_to(afgeleide, vorm).copy()
+
+    # alleen variabele wordt een duaal getal, de andere variabelen blijven gewone getallen
+    def _dualeWaarde(self, variabele, variabelen, m):
+        def reken(node, kinderen):
+            if isinstance(node, Variable):
+                if node.teken not in variabelen:
+                    raise ValueError("variabele '%s' heeft geen waarde gekregen" % node.teken)
+                if node.teken == variabele:
+                    return Dual(variabelen[node.teken], 1)
+                return variabelen[node.teken]
+            return node._rekenKnoop(kinderen, m)
+        return postorder(self, reken)
+
+    # de waarde van een node uit die van zijn kinderen, voor gradient()
+    def _rekenKnoop(self, kinderen, m):
+        return self.operatie(*kinderen)
+
     # operator overloading:
     # this allows us to perform 'arithmetic' with expressions, and obtain another expression
     def __add__(self, other):
@@ -74,11 +867,366 @@ class Expression():
     def __neg__(self):
         return NegNode(self)
 
+    # Compileren van de boom naar een gewone Python functie.
+    # variables is de lijst met variabelen, in de volgorde waarin de functie
+    # ze als positionele argumenten verwacht, bv. f = expr.compile(['x','y']); f(1.0, 2.0)
+    # De boom wordt maar een keer doorlopen; elke tussenuitkomst wordt een lokale
+    # variabele in de gegenereerde functie, zo hoeft Python geen diep geneste expressie te compileren.
+    # Deelbomen die meerdere keren voorkomen worden via cse() maar een keer uitgerekend.
+    def compile(self, variables):
+        namen = {}
+        for i, variabele in enumerate(variables):
+            namen[variabele] = 'v%d' % i
+        regels = []
+        gereduceerd, tijdelijk = self.cse()
+        code = lambda node, kinderen: node._codeKnoop(kinderen, regels, namen)
+        for variabele, deelboom in tijdelijk:
+            namen[variabele.teken] = postorder(deelboom, code)
+        uitkomst = postorder(gereduceerd, code)
+
+        bron = ['def gecompileerd(%s):' % ', '.join('v%d' % i for i in range(len(variables)))]
+        for regel in regels:
+            bron.append('    ' + regel)
+        bron.append('    return ' + uitkomst)
+
+        omgeving = dict(compile_functies)
+        exec('\n'.join(bron), omgeving)
+        functie = omgeving['gecompileerd']
+        functie.__doc__ = str(self)
+        return functie
+
+    # Vul een deel van de variabelen in en compileer de rest, bv. voor een parameter sweep:
+    #     f = expr.specialize({'a': 1.5, 'b': 2}, free=['x']); f(0.5)
+    # Eerst vult evaluate de waarden in en vouwt simplify alle constanten samen (ook verspreide,
+    # zoals 2 * x * a met a = 3), daarna wordt wat overblijft gecompileerd met free als argumenten (zonder free: de overgebleven variabelen
+    # op alfabet). De functie wordt per expressie en per set waarden bewaard in specialize_cache.
+    def specialize(self, variabelen, free=None):
+        if free is not None:
+            free = tuple(free)
+        sleutel = (waarden_sleutel(variabelen, self.variables()), free)
+        functie = specialize_cache.get_node(self, sleutel)
+        if functie is not None:
+            return functie
+
+        rest = self.evaluate(variabelen).simplify()
+        over = rest.variables()
+        if free is None:
+            free = tuple(sorted(over))
+        elif not over <= set(free):
+            raise ValueError("variabelen %s hebben geen waarde en staan niet in free"
+                             % ', '.join(sorted(over - set(free))))
+        functie = rest.compile(free)
+        specialize_cache.put_node(self, sleutel, functie)
+        return functie
+
+    #Numerieke integratie. Met een variabele is het integrate() (adaptief, zonder afronden),
+    #met meer variabelen gridIntegrate() (Simpson op een rooster). Een getal in plaats van een
+    #interval zet die variabele vast.
+    def numIntegrate(self,variables,intervals):
+        #voor 1 variabele
+        if isinstance(variables,str):
+            return self.integrate(variables, intervals)[0]
+        
+        #voor 1 variabele voor het geval dat deze in een lijst staat
+        elif (isinstance(variables,list) and len(variables)==1 and isinstance(intervals[0],list)):
+            return self.integrate(variables[0], intervals[0])[0]
+        
+        #voor meerdere variabelen
+        return self.gridIntegrate(variables, intervals)
+
+    # Adaptieve Gauss-Kronrod integratie naar variabele over interval (mag float zijn, en
+    # b < a geeft een negatieve uitkomst). Geeft (waarde, foutschatting) terug. Het stuk met de
+    # grootste fout wordt steeds gehalveerd, tot de fout onder max(atol, rtol * |waarde|) zit
+    # of er max_evaluaties keer geevalueerd is; dan is de foutschatting groter dan gevraagd.
+    # De expressie mag naast variabele geen andere variabelen hebben.
+    def integrate(self, variabele, interval, rtol=1e-10, atol=1e-12, max_evaluaties=10000):
+        over = self.variables() - {variabele}
+        if over:
+            raise ValueError("variabelen %s hebben geen waarde" % ', '.join(sorted(over)))
+        f = self.compile([variabele])
+        a, b = float(interval[0]), float(interval[1])
+
+        waarde, fout = _kronrod(f, a, b)
+        evaluaties = 15
+        # heapq geeft het kleinste eerst, dus de fout negatief
+        stukken = [(-fout, a, b, waarde)]
+        totaal, totale_fout = waarde, fout
+        while totale_fout > max(atol, rtol * abs(totaal)) and evaluaties + 30 <= max_evaluaties:
+            fout, a, b, waarde = heapq.heappop(stukken)
+            midden = (a + b) / 2
+            links, links_fout = _kronrod(f, a, midden)
+            rechts, rechts_fout = _kronrod(f, midden, b)
+            evaluaties += 30
+            heapq.heappush(stukken, (-links_fout, a, midden, links))
+            heapq.heappush(stukken, (-rechts_fout, midden, b, rechts))
+            totaal += links + rechts - waarde
+            totale_fout += links_fout + rechts_fout + fout
+        # opnieuw optellen, zo stapelen de afrondfouten van alle updates niet op
+        return math.fsum(stuk[3] for stuk in stukken), math.fsum(-stuk[0] for stuk in stukken)
+
+    # Integratie op een rooster in een willekeurig aantal dimensies, bv.
+    #     expr.gridIntegrate(['x', 'y'], [[0, 1], [0, 2.5]], stappen=200)
+    # Elk roosterpunt wordt maar een keer geevalueerd, met numpy in een keer via evaluate_array
+    # en anders een keer per punt met een gecompileerde functie. De uitkomst is de gewogen som
+    # met de gewichten van regel ('simpson' of 'trapezium') in elke richting. stappen is het
+    # aantal stukken per variabele (een getal of een lijst), voor Simpson wordt dat even gemaakt.
+    # Een getal in plaats van een interval zet die variabele vast.
+    def gridIntegrate(self, variabelen, intervallen, stappen=100, regel='simpson'):
+        if isinstance(variabelen, str):
+            variabelen, intervallen = [variabelen], [intervallen]
+        vast = {}
+        assen = []
+        for variabele, interval in zip(variabelen, intervallen):
+            if isinstance(interval, (list, tuple)):
+                assen.append((variabele, float(interval[0]), float(interval[1])))
+            else:
+                vast[variabele] = interval
+        expressie = self.evaluate(vast) if vast else self
+        over = expressie.variables() - set(variabele for variabele, a, b in assen)
+        if over:
+            raise ValueError("variabelen %s hebben geen waarde" % ', '.join(sorted(over)))
+        if isinstance(stappen, int):
+            stappen = [stappen] * len(assen)
+
+        punten = []
+        gewichten = []
+        for (variabele, a, b), aantal in zip(assen, stappen):
+            if regel == 'simpson' and aantal % 2 == 1:
+                aantal += 1
+            stap = (b - a) / aantal
+            punten.append([a + i * stap for i in range(aantal + 1)])
+            gewichten.append(_roostergewichten(aantal, stap, regel))
+
+        if np is not None:
+            # as d krijgt de vorm (1, .., n_d, .., 1), numpy broadcast dat tot het hele rooster
+            arrays = {}
+            for d, (variabele, a, b) in enumerate(assen):
+                vorm = [1] * len(assen)
+                vorm[d] = len(punten[d])
+                arrays[variabele] = np.array(punten[d]).reshape(vorm)
+            waarden = np.broadcast_to(expressie.evaluate_array(arrays), tuple(len(p) for p in punten))
+            # telkens de eerste as wegsommeren met zijn gewichten
+            for gewicht in gewichten:
+                waarden = np.tensordot(np.array(gewicht), waarden, axes=(0, 0))
+            return float(waarden)
+
+        f = expressie.compile([variabele for variabele, a, b in assen])
+        def termen():
+            for punt in itertools.product(*[list(zip(p, g)) for p, g in zip(punten, gewichten)]):
+                gewicht = 1.0
+                for x, g in punt:
+                    gewicht *= g
+                yield gewicht * f(*[x for x, g in punt])
+        return math.fsum(termen())
+
+    # Evaluatie over hele numpy arrays tegelijk, bv. expr.evaluate_array({'x': xs, 'y': ys})
+    # Elke node wordt maar een keer bekeken; de arrays worden volgens de numpy regels
+    # gebroadcast. Alle variabelen moeten een waarde krijgen, het resultaat is een array.
+    def evaluate_array(self, variabelen):
+        if np is None:
+            raise ImportError("evaluate_array heeft numpy nodig")
+        arrays = {}
+        for teken, waarde in variabelen.items():
+            arrays[teken] = np.asarray(waarde, dtype=float)
+        uitkomst = np.asarray(postorder(self, lambda node, kinderen: node._arrayKnoop(kinderen, arrays)), dtype=float)
+        # zonder (gebruikte) variabelen is de uitkomst een getal, dat wordt een array zo groot als de invoer
+        vorm = np.broadcast_shapes(uitkomst.shape, *[array.shape for array in arrays.values()])
+        if uitkomst.shape != vorm:
+            uitkomst = np.broadcast_to(uitkomst, vorm).copy()
+        return uitkomst
+
+    # Common subexpression elimination.
+    # Geeft (gereduceerd, tijdelijk) terug: tijdelijk is een lijst met paren (Variable('_t0'), deelboom)
+    # voor elke deelboom die meer dan een keer voorkomt, in de volgorde waarin ze uitgerekend
+    # moeten worden. Een deelboom mag eerdere tijdelijke variabelen gebruiken, en gereduceerd is
+    # de expressie zelf uitgedrukt in de tijdelijke variabelen. Zie ook evaluate_cse.
+    def cse(self):
+        dag = intern(self)
+
+        # tel voor elke node hoeveel ouders hem gebruiken, elke node wordt maar een keer bezocht
+        ouders = {}
+        namen = set()
+        volgorde = []
+        stack = [dag]
+        while stack:
+            node = stack.pop()
+            if id(node) in ouders:
+                continue
+            ouders[id(node)] = 0
+            volgorde.append(node)
+            if isinstance(node, Variable):
+                namen.add(node.teken)
+            stack.extend(node._kinderen())
+        for node in volgorde:
+            for kind in node._kinderen():
+                ouders[id(kind)] += 1
+
+        # tijdelijke variabelen mogen niet botsen met de variabelen in de expressie
+        voorvoegsel = '_t'
+        while any(naam.startswith(voorvoegsel) for naam in namen):
+            voorvoegsel = '_' + voorvoegsel
+
+        # bouw de expressie van onder naar boven opnieuw op, gedeelde deelbomen worden
+        # vervangen door hun tijdelijke variabele
+        tijdelijk = []
+        def vervang(node, kinderen):
+            nieuw = node._vervangKinderen(kinderen)
+            if kinderen and ouders[id(node)] > 1:
+                variabele = Variable('%s%d' % (voorvoegsel, len(tijdelijk)))
+                tijdelijk.append((variabele, nieuw))
+                nieuw = variabele
+            return nieuw
+
+        return postorder(dag, vervang), tijdelijk
+
+    # Geeft de gedeelde (geinterneerde) versie van deze expressie terug, zie intern()
+    def intern(self):
+        return intern(self)
+
+    # Omzetten naar een Tape: een platte RPN lijst van opcodes, zie de class Tape
+    def to_tape(self):
+        tape = Tape()
+        constanten = {}
+        variabelen = {}
+        postorder(self, lambda node, kinderen: node._tapeKnoop(tape, constanten, variabelen), gedeeld=False)
+        return tape
+
+    # Binaire vorm van de expressie (de tape als bytes), zie Tape.dumps
+    def dumps(self):
+        return self.to_tape().dumps()
+
+    # De expressie uit bytes van dumps(). data mag ook een mmap of memoryview zijn, offset is
+    # dan de plek waar de expressie begint.
+    @staticmethod
+    def loads(data, offset=0):
+        return Tape.loads(data, offset).to_expression()
+
+    # Shunting-yard zonder tussenliggende RPN lijst: bij het afbouwen van de operatorstack
+    # wordt meteen de node gemaakt. Aanroepen zonder dummy object: Expression.parse('x + 1')
+    # Een min aan het begin, na een operator of na een '(' is een negatie. Een formule die
+    # niet klopt (bv. haakjes die niet sluiten of twee operatoren achter elkaar) geeft een ParseError.
+    # Met engine='pratt' wordt de PrattParser gebruikt, die geeft dezelfde bomen. Die gaat
+    # buiten parse_cache om, zodat hij ook echt zelf parset (bv. in benchmark.py).
+    @staticmethod
+    def parse(string, engine='shunting-yard'):
+        if engine == 'pratt':
+            return PrattParser(string).parse()
+        if engine != 'shunting-yard':
+            raise ValueError("onbekende parser: %r" % engine)
+        gevonden = parse_cache.get(string)
+        if gevonden is not None:
+            return gevonden[0]
+
+        # operatoren, '(' en functienamen die nog verwerkt moeten worden
+        stack = []
+        # de al gemaakte (deel)bomen
+        operanden = []
+
+        # pak de bovenste operator van de stack en maak er een node van
+        def reduceer():
+            op = stack.pop()
+            if op == '~':
+                operanden[-1] = NegNode(operanden[-1])
+            else:
+                rechts = operanden.pop()
+                operanden[-1] = binaire_nodes[op](operanden[-1], rechts)
+
+        # als verwacht_operand waar is moet er een getal, variabele, functie, '(' of negatie komen
+        verwacht_operand = True
+        tokens = scan(string)
+        for i, token in enumerate(tokens):
+            soort, tekst, positie = token
+
+            if soort == 'getal' or (soort == 'naam' and tekst not in functie_nodes):
+                if not verwacht_operand:
+                    raise ParseError("operator verwacht voor %r" % tekst, positie)
+                if soort == 'getal':
+                    operanden.append(Constant(tekst_naar_getal(tekst)))
+                else:
+                    operanden.append(Variable(tekst))
+                verwacht_operand = False
+
+            elif soort == 'naam':
+                # een functie moet direct gevolgd worden door een '('
+                if not verwacht_operand:
+                    raise ParseError("operator verwacht voor %r" % tekst, positie)
+                if i + 1 == len(tokens) or tokens[i + 1].tekst != '(':
+                    raise ParseError("'(' verwacht na %s" % tekst, positie)
+                stack.append(tekst)
+
+            elif soort == 'operator':
+                if verwacht_operand:
+                    if tekst != '-':
+                        raise ParseError("getal of variabele verwacht voor %r" % tekst, positie)
+                    # negatie: een prefix operator haalt niets van de stack
+                    stack.append('~')
+                    continue
+                precedence, associativiteit = order_op[tekst]
+                while stack and stack[-1] in order_op:
+                    boven = order_op[stack[-1]][0]
+                    if boven > precedence or (boven == precedence and associativiteit == 0):
+                        reduceer()
+                    else:
+                        break
+                stack.append(tekst)
+                verwacht_operand = True
+
+            elif tekst == '(':
+                if not verwacht_operand:
+                    raise ParseError("operator verwacht voor '('", positie)
+                stack.append(tekst)
+
+            elif tekst == ')':
+                if verwacht_operand:
+                    raise ParseError("getal of variabele verwacht voor ')'", positie)
+                while stack and stack[-1] != '(':
+                    reduceer()
+                if not stack:
+                    raise ParseError("')' zonder '('", positie)
+                stack.pop()
+                if stack and stack[-1] in functie_nodes:
+                    operanden[-1] = functie_nodes[stack.pop()](operanden[-1])
+
+            else:
+                # functies met meerdere argumenten zijn er (nog) niet
+                raise ParseError("onverwachte komma", positie)
+
+        if verwacht_operand:
+            raise ParseError("formule is onvolledig", len(string))
+        while stack:
+            if stack[-1] == '(':
+                raise ParseError("'(' wordt niet gesloten", len(string))
+            reduceer()
+
+        parse_cache.put(string, (operanden[0], None))
+        return operanden[0]
+
+    # de RPN lijst van de laatste fromString op dit object
+    @property
+    def output(self):
+        try:
+            return rpn_uitvoer[id(self)]
+        except KeyError:
+            raise AttributeError('output')
+
+    @output.setter
+    def output(self, output):
+        if id(self) not in rpn_uitvoer:
+            weakref.finalize(self, rpn_uitvoer.pop, id(self), None)
+        rpn_uitvoer[id(self)] = output
+
     # basic Shunting-yard algorithm
+    # Eerder geparste strings komen uit parse_cache; de bomen daar worden gedeeld en
+    # mogen dus niet aangepast worden (geen enkele operatie in deze module doet dat).
     def fromString(self, string):
+        gevonden = parse_cache.get(string)
+        # een boom van Expression.parse heeft geen RPN lijst, dan wordt er opnieuw geparst
+        if gevonden is not None and gevonden[1] is not None:
+            self.output = list(gevonden[1])
+            return gevonden[0]
         
-        # split into tokens
-        tokens = tokenize(string)
+        # split into tokens, elke token weet al of het een getal, naam, operator, haakje of komma is
+        tokens = scan(string)
         
         # stack used by the Shunting-Yard algorithm
         stack = []
@@ -87,49 +1235,31 @@ class Expression():
         # this will contain Constant's and '+'s
         output = []
         
-        # list of operators
-
-        oplist = ['+','-', '*', '/','**']
-        funclist = ['sin', 'cos','exp','log','tan']
-        funcuitvoer  = { 'sin' : SinNode, 'cos' : CosNode , 'exp': ExpNode, 'log': LogNode, 'tan': TanNode}
-
-        # order_op index 0 is order, index 1 is associativity (0=left, 1=right)
-        Nodes = [AddNode,SubNode,DivNode,MulNode,PowNode,NegNode]
-        
-        
-        #hier wordt een lijst gemaakt met de precedence en associativiteit
-        order_op = {}
-        for node in Nodes:
-            if node == NegNode:
-                a = node(0)
-                order_op[a.op_symbol]=[a.precedence,a.associativiteit]
-            else:
-                a = node(0,0)
-                order_op[a.op_symbol]=[a.precedence,a.associativiteit]
-        
+        # de lijsten met operatoren en functies en de tabel order_op staan bovenin de module
+        oplist = operatoren
+        funclist = functie_nodes
+        funcuitvoer = functie_nodes
         
         # het getal i geeft aan om welke token het gaat
         i = 0 
         
         while i< len(tokens):
+            token = tokens[i].tekst
             
             # als de huidige token een getal is wordt deze direct naar de output gestuurd
-            if isnumber(tokens[i]):
-                if isint(tokens[i]):
-                    output.append(Constant(int(tokens[i])))
-                else:
-                    output.append(Constant(float(tokens[i])))
+            if tokens[i].soort == 'getal':
+                output.append(Constant(tekst_naar_getal(token)))
                     
             # als de token in de lijst met functies staat dan wordt deze naar de stack gestuurd        
             
-            elif tokens[i] in funclist:
-                stack.append(tokens[i])
+            elif token in funclist:
+                stack.append(token)
                 
             # als de token een operator is moeten verschillende dingen worden gecontroleerd
             
-            elif tokens[i] in oplist:
-                if tokens[i] == '-' and (
-                    tokens[i-1] in oplist + ['('] or len(output)==0):  
+            elif token in oplist:
+                if token == '-' and (
+                    tokens[i-1].tekst in voor_negatie or len(output)==0):  
                     # we hebben gecontroleerd of het minnetje wat we tegen komen een negate is, 
                     # als dit het geval is sturen we negate naar de stack
                     stack.append('~')    
@@ -137,26 +1267,26 @@ class Expression():
                     # als de operator geen negate is dan wordt hier bepaald in welke volgorde de operatoren naar de output moeten
                     while True:
                         #als er niks in de stack zit dan moet de operator sowieso naar de stack
-                        if len(stack) == 0 or stack[-1] not in oplist+['~']:
+                        if len(stack) == 0 or stack[-1] not in operatoren_negatie:
                             break
                         
                         # Shunting Yard algoritme, met de regels van de volgorde van operaties wordt bepaald
                         # wanneer operatoren van de stack naar de output moeten
-                        elif (order_op[tokens[i]][1]==0 and order_op[tokens[i]][0] <= order_op[stack[-1]][0]
-                            ) or (order_op[tokens[i]][1]==1 and order_op[tokens[i]][0]<order_op[stack[-1]][0]):
+                        elif (order_op[token][1]==0 and order_op[token][0] <= order_op[stack[-1]][0]
+                            ) or (order_op[token][1]==1 and order_op[token][0]<order_op[stack[-1]][0]):
                             
                             output.append(stack.pop())
                         else:
                             break
                     # de huidige token wordt altijd naar de stack gestuurd
-                    stack.append(tokens[i])
+                    stack.append(token)
                    
 
-            elif tokens[i] == '(':
+            elif token == '(':
                 # linker haakjes gaan naar de stack
-                stack.append(tokens[i])
+                stack.append(token)
                 
-            elif tokens[i] == ')':
+            elif token == ')':
                 # rechter haakje: pop alles van de stack naar de outpu totdat we een linkerhaakje tegen komen
                 while not stack[-1] == '(':
                     output.append(stack.pop())
@@ -165,10 +1295,15 @@ class Expression():
                 stack.pop()
                 if len(stack)> 0 and stack[-1] in funclist:
                     output.append(stack.pop())
+
+            elif token == ',':
+                # komma tussen argumenten: pop alles tot het linkerhaakje van de functie
+                while not stack[-1] == '(':
+                    output.append(stack.pop())
             
             #als de token geen getal, operator, haakje of functie is is het een variabele
             else:
-                output.append(Variable(tokens[i]))
+                output.append(Variable(token))
             
             i += 1
         
@@ -180,10 +1315,10 @@ class Expression():
         # convert RPN to an actual expression tree
         for t in output:
             if t in oplist :
-                # let eval and operator overloading take care of figuring out what to do
+                # de bijbehorende node class wordt opgezocht in binaire_nodes
                 y = stack.pop()
                 x = stack.pop()
-                stack.append(eval('x %s y' % t))
+                stack.append(binaire_nodes[t](x, y))
             elif t in funclist:
                 # functies zijn UnaryNodes en werken maar op 1 getal
                 x = stack.pop()
@@ -200,26 +1335,55 @@ class Expression():
             
                 
         # the resulting expression tree is what's left on the stack
+        parse_cache.put(string, (stack[0], list(output)))
         return stack[0]
 
 
 # Storing constant values  
 class Constant(Expression):
     #Represents a constant value
+    __slots__ = ('value',)
+    precedence = 10
+
     def __init__(self, value):
         self.value = value
-        self.precedence =10
 
     # Overload of equality sign   
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Constant):
             return self.value == other.value
         else:
             return False
+
+    # hash die past bij __eq__
+    def __hash__(self):
+        return hash(self.value)
+
+    # vergelijking van alleen deze node, voor Expression.__eq__
+    def _zelfdeKnoop(self, other):
+        return isinstance(other, Constant) and self.value == other.value
+
+    def _hashKnoop(self, kinderen):
+        return hash(self.value)
+
+    # een constante heeft geen variabelen
+    def _vrijKnoop(self, kinderen):
+        return frozenset()
+
+    def _gevouwenKnoop(self):
+        return True
+
+    def _rekenKnoop(self, kinderen, m):
+        return self.value
     
     # Overload of tostring   
     def __str__(self):
         return str(self.value)
+
+    def _stukken(self):
+        return [str(self.value)]
         
     # allow conversion to int
     def __int__(self):
@@ -232,13 +1396,59 @@ class Constant(Expression):
     # if evaluation is called, the constant is returned   
     def evaluate(self,variabelen={}):
         return self
+
+    def _evalueer(self, kinderen, variabelen):
+        return self
     
     # returns the value without casting a specific type    
     def constantvalue(self):
         return self.value
     
+    # een constante integreren kan exact, met een of meer variabelen
     def numIntegrate(self,variabele,interval):
-        return (self.value *(interval[1] -interval[0]))
+        if isinstance(variabele, str):
+            return (self.value *(interval[1] -interval[0]))
+        uitkomst = self.value
+        for stuk in interval:
+            if isinstance(stuk, (list, tuple)):
+                uitkomst *= stuk[1] - stuk[0]
+        return uitkomst
+
+    def integrate(self, variabele, interval, rtol=1e-10, atol=1e-12, max_evaluaties=10000):
+        return self.value * (interval[1] - interval[0]), 0.0
+
+    # een constante heeft geen kinderen
+    def _kinderen(self):
+        return ()
+
+    def _vervangKinderen(self, kinderen):
+        return self
+
+    # sleutel voor de intern tabel; 2 en 2.0 blijven verschillende nodes
+    def _internSleutel(self, kinderen):
+        return ('c', getal_sleutel(self.value))
+
+    # op de tape komt een verwijzing naar de constantenlijst, dubbele constanten worden gedeeld
+    def _tapeKnoop(self, tape, constanten, variabelen):
+        sleutel = getal_sleutel(self.value)
+        if sleutel not in constanten:
+            constanten[sleutel] = len(tape.constanten)
+            tape.constanten.append(self.value)
+        tape.opcodes.append(OP_CONST)
+        tape.operanden.append(constanten[sleutel])
+
+    # bij array evaluatie is een constante gewoon een getal, numpy broadcast dat
+    def _arrayKnoop(self, kinderen, arrays):
+        return self.value
+
+    # code voor compile: een constante wordt direct in de code gezet
+    def _codeKnoop(self, kinderen, regels, namen):
+        # repr van inf en nan is geen geldige Python code
+        if isinstance(self.value, float) and not math.isfinite(self.value):
+            return "float('%r')" % (self.value,)
+        if self.value < 0:
+            return '(%r)' % (self.value,)
+        return repr(self.value)
     
     # waarde teruggeven bij differentiatie
     # Als leaf True is, dan moet onmiddelijk de afgeleide worden teruggegeven
@@ -246,262 +1456,458 @@ class Constant(Expression):
     # in de boom bepaald wat er mee moet gebeuren
     def dif(self,leaf=True):
         if leaf:
-            return Constant(0)
+            return NUL
         else:
-            return self    
+            return self
+
+    def _difKnoop(self, afgeleiden):
+        return NUL
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return NUL
         
 #hier defineren we de variabelen        
 class Variable(Expression):
+    __slots__ = ('teken',)
+    precedence = 10
     
     #initialisatie
     def __init__(self,teken):
         self.teken = teken
-        self.precedence = 10
     
     #overloaden van de tostring functie
     def __str__(self):
         return str(self.teken)
+
+    def _stukken(self):
+        return [str(self.teken)]
     
     #overlaoden van de equals functie
     def __eq__(self,other):
+        if self is other:
+            return True
         if isinstance(other, Variable):
             return self.teken == other.teken
         else:
             return False
+
+    # hash die past bij __eq__
+    def __hash__(self):
+        return hash(self.teken)
+
+    # vergelijking van alleen deze node, voor Expression.__eq__
+    def _zelfdeKnoop(self, other):
+        return isinstance(other, Variable) and self.teken == other.teken
+
+    def _hashKnoop(self, kinderen):
+        return hash(self.teken)
+
+    def _vrijKnoop(self, kinderen):
+        return frozenset([self.teken])
+
+    def _gevouwenKnoop(self):
+        return True
+
+    # sleutel voor de intern tabel
+    def _internSleutel(self, kinderen):
+        return ('v', self.teken)
+
+    # een variabele heeft geen kinderen
+    def _kinderen(self):
+        return ()
+
+    def _vervangKinderen(self, kinderen):
+        return self
             
     #evaluate geeft een constante waarde als x is gesubsitueerd, anders de (ongesubstitueerde) variabele zelf      
     def evaluate(self,variabelen ={}):
         if self.teken in variabelen:
-            return Constant(variabelen[self.teken])
+            waarde = variabelen[self.teken]
+            # een expressie als waarde wordt gesubstitueerd
+            if isinstance(waarde, Expression):
+                return waarde
+            return Constant(waarde)
         else:
             return self
+
+    def _evalueer(self, kinderen, variabelen):
+        return self.evaluate(variabelen)
+
+    # op de tape komt een verwijzing naar de variabelenlijst
+    def _tapeKnoop(self, tape, constanten, variabelen):
+        if self.teken not in variabelen:
+            variabelen[self.teken] = len(tape.variabelen)
+            tape.variabelen.append(self.teken)
+        tape.opcodes.append(OP_VAR)
+        tape.operanden.append(variabelen[self.teken])
+
+    # bij array evaluatie wordt de array van deze variabele opgezocht
+    def _arrayKnoop(self, kinderen, arrays):
+        if self.teken not in arrays:
+            raise ValueError("variabele '%s' heeft geen waarde gekregen" % self.teken)
+        return arrays[self.teken]
+
+    # code voor compile: de variabele wordt het bijbehorende argument
+    def _codeKnoop(self, kinderen, regels, namen):
+        if self.teken not in namen:
+            raise ValueError("variabele '%s' komt niet voor in de variabelen van compile" % self.teken)
+        return namen[self.teken]
     
     # waarde teruggeven bij differentiatie
     # Als leaf is aangeroepen, dan moet de afgeleide van een niet binary worden
     # bepaald. Dan moet direct de afgeleide worden gegeven
     def dif(self, leaf=True):
         if leaf:
-            return Constant(1)
+            return EEN
         else:
             return self
+
+    def _difKnoop(self, afgeleiden):
+        return EEN
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return EEN if self.teken == variabele else NUL
             
 class NegNode(Expression):
+    __slots__ = ('invoer',)
+    # het teken, de precedence en de associativiteit zijn voor elke negatie hetzelfde
+    op_symbol = '~'
+    precedence = 3
+    associativiteit = 1
+    operatie = staticmethod(operator.neg)
     
-    #initialisatie van de negnode. De inwendige invoer wordt meegegeven, het teken en de precedence
+    #initialisatie van de negnode. Alleen de inwendige invoer wordt meegegeven
     def __init__(self, invoer):
         self.invoer = invoer
-        self.op_symbol = '~'
-        self.precedence = 3
-        self.associativiteit = 1
+
+    # twee negaties zijn gelijk als hun invoer gelijk is, de invoer vergelijkt Expression.__eq__
+    def _zelfdeKnoop(self, other):
+        return isinstance(other, NegNode)
+
+    def _hashKnoop(self, kinderen):
+        return hash(('~', kinderen[0]))
+
+    # sleutel voor de intern tabel: het type en de al geinterneerde invoer
+    def _internSleutel(self, kinderen):
+        return (NegNode, id(kinderen[0]))
+
+    # het enige kind is de invoer
+    def _kinderen(self):
+        return (self.invoer,)
+
+    # dezelfde node met een andere invoer, als die niet verandert blijft het deze node
+    def _vervangKinderen(self, kinderen):
+        if kinderen[0] is self.invoer:
+            return self
+        return NegNode(kinderen[0])
+
     #printen. Indien de precedence van de invoer lager is, dan zijn er haakjes nodig
-    def __str__(self):
+    def _stukken(self):
         if self.invoer.precedence < self.precedence:
-            return "- (%s)" % (self.invoer)
+            return ["- (", self.invoer, ")"]
         else:
-            return "- %s" % (self.invoer)
+            return ["- ", self.invoer]
 
     #Evaluatie. Wanneer de invoer een constante is, maak dan een nieuwe constante aan
     #Wanneer de invoer iets anders is, dan moet er een nieuwe 
-    def evaluate(self,variabelen={}):
-        getal = self.invoer.evaluate(variabelen)
+    def _evalueer(self, kinderen, variabelen):
+        getal = kinderen[0]
         if isinstance(getal,Constant):
             return Constant(-getal.value)
                 #eval("%s %s %s" % (Constant(-1),'*',getal)))
         else:
-            return NegNode(self.invoer.evaluate())
+            return NegNode(getal)
     
     #Differentiatie betekent dat differentiatie van expression node moet worden teruggegeven
-    def dif(self,leaf=False):
-        return NegNode(self.invoer.dif())
+    def _difKnoop(self, afgeleiden):
+        return NegNode(afgeleiden[0])
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _tegengesteld(afgeleiden[0])
+
+    def _partieel(self, kinderen, waarde, m):
+        return (-1,)
+
+    # op de tape komt na de invoer de negatie
+    def _tapeKnoop(self, tape, constanten, variabelen):
+        tape.opcodes.append(OP_NEG)
+        tape.operanden.append(0)
+
+    # array evaluatie
+    def _arrayKnoop(self, kinderen, arrays):
+        return -kinderen[0]
+
+    # code voor compile
+    def _codeKnoop(self, kinderen, regels, namen):
+        regels.append('t%d = -%s' % (len(regels), kinderen[0]))
+        return 't%d' % (len(regels) - 1)
     
 
 # Super classen van de functies exp, sin, cos 
 class FunctionNode(Expression):
+    __slots__ = ('invoer',)
+    precedence = 10
     
-    #Elke functie moet meekrijgen het type functie, de invoer en de operatie
-    def __init__(self, invoer ,func_symbol):
-        self.func_symbol = func_symbol
+    #Elke subclass geeft op de class het type functie (func_symbol) en de operatie mee,
+    #per node wordt alleen de invoer opgeslagen
+    def __init__(self, invoer):
         self.invoer = invoer
-        self.operatie = self.operatie
-        self.precedence = 10
+
+    # twee functies zijn gelijk als het dezelfde functie is, de invoer vergelijkt Expression.__eq__
+    def _zelfdeKnoop(self, other):
+        return type(self) == type(other)
+
+    def _hashKnoop(self, kinderen):
+        return hash((self.func_symbol, kinderen[0]))
+
+    # sleutel voor de intern tabel: het type en de al geinterneerde invoer
+    def _internSleutel(self, kinderen):
+        return (type(self), id(kinderen[0]))
+
+    # het enige kind is de invoer
+    def _kinderen(self):
+        return (self.invoer,)
+
+    # dezelfde functie met een andere invoer, als die niet verandert blijft het deze node
+    def _vervangKinderen(self, kinderen):
+        if kinderen[0] is self.invoer:
+            return self
+        return type(self)(kinderen[0])
 
     #De printfunctie. De invoer moet altijd om haakjes worden gezet.
-    def __str__(self):
-        return "%s (%s)" % (self.func_symbol,self.invoer)
+    def _stukken(self):
+        return ["%s (" % self.func_symbol, self.invoer, ")"]
+
+    # de functie met dezelfde naam uit m (math, of iets dat met andere getallen rekent)
+    def _rekenKnoop(self, kinderen, m):
+        return getattr(m, self.func_symbol)(kinderen[0])
     
     #Eerste wordt invoer geevalueerd. Als dit geen getal oplevert dan moet 
     #dit geevalueerd worden als een getal. Als iets anders oplevert moet de ver
     #eenvoudigde invoer worden teruggegeven. 
-    def evaluate(self,variabelen={}):
-        evaluated = self.invoer.evaluate(variabelen)
+    def _evalueer(self, kinderen, variabelen):
+        evaluated = kinderen[0]
         if not isinstance(evaluated, Constant):
-            toreturn = copy.copy(self)
-            toreturn.invoer = evaluated
-            return self
+            return type(self)(evaluated)
         else:
-            return self.operatie(evaluated)
+            return Constant(self.operatie(evaluated.value))
+
+    # op de tape komt na de invoer de functie
+    def _tapeKnoop(self, tape, constanten, variabelen):
+        tape.opcodes.append(tape_opcodes[self.func_symbol])
+        tape.operanden.append(0)
+
+    # array evaluatie met de numpy ufunc met dezelfde naam (np.sin, np.exp, ...)
+    def _arrayKnoop(self, kinderen, arrays):
+        return getattr(np, self.func_symbol)(kinderen[0])
+
+    # code voor compile, de functie wordt opgezocht in compile_functies
+    def _codeKnoop(self, kinderen, regels, namen):
+        regels.append('t%d = %s(%s)' % (len(regels), self.func_symbol, kinderen[0]))
+        return 't%d' % (len(regels) - 1)
         
 # Een subclass van functionnode
 class SinNode(FunctionNode):
     
     #De operatie is sinus met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.sin
-        super(SinNode,self).__init__(invoer, 'sin')
+    __slots__ = ()
+    func_symbol = 'sin'
+    operatie = staticmethod(math.sin)
     
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return CosNode(self.invoer)*self.invoer.dif()
+    #Geef de afgeleide terug, afgeleiden[0] is de afgeleide van de invoer
+    def _difKnoop(self, afgeleiden):
+        return CosNode(self.invoer)*afgeleiden[0]
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _maal(CosNode(self.invoer), afgeleiden[0])
+
+    # de afgeleide naar de invoer, in getallen
+    def _partieel(self, kinderen, waarde, m):
+        return (m.cos(kinderen[0]),)
 
 # Een subclass van functionnode
 class CosNode(FunctionNode):
     
     #De operatie is cosinus met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.cos
-        super(CosNode,self).__init__(invoer, 'cos')
+    __slots__ = ()
+    func_symbol = 'cos'
+    operatie = staticmethod(math.cos)
     
     #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return NegNode(SinNode(self.invoer))*self.invoer.dif()  
+    def _difKnoop(self, afgeleiden):
+        return NegNode(SinNode(self.invoer))*afgeleiden[0]
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _tegengesteld(_maal(SinNode(self.invoer), afgeleiden[0]))
+
+    def _partieel(self, kinderen, waarde, m):
+        return (-m.sin(kinderen[0]),)
 
 class TanNode(FunctionNode):
 
     #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.tan
-        super(TanNode,self).__init__(invoer, 'tan')
+    __slots__ = ()
+    func_symbol = 'tan'
+    operatie = staticmethod(math.tan)
     
     #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return DivNode(Constant(1),PowNode(CosNode(self.invoer),Constant(2)))* self.invoer.dif()
+    def _difKnoop(self, afgeleiden):
+        return DivNode(EEN,PowNode(CosNode(self.invoer),Constant(2)))* afgeleiden[0]
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _deel(afgeleiden[0], PowNode(CosNode(self.invoer), Constant(2)))
+
+    def _partieel(self, kinderen, waarde, m):
+        return (1 + waarde * waarde,)
 # Een subclass van functionnode
 class ExpNode(FunctionNode):
     
     #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.exp
-        super(ExpNode,self).__init__(invoer, 'exp')
+    __slots__ = ()
+    func_symbol = 'exp'
+    operatie = staticmethod(math.exp)
     
     #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return ExpNode(self.invoer)*self.invoer.dif() 
+    def _difKnoop(self, afgeleiden):
+        return ExpNode(self.invoer)*afgeleiden[0]
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _maal(self, afgeleiden[0])
+
+    def _partieel(self, kinderen, waarde, m):
+        return (waarde,)
 
 # Een subclass van functionnode
 class LogNode(FunctionNode):
     
     #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.log
-        super(LogNode,self).__init__(invoer, 'log')
+    __slots__ = ()
+    func_symbol = 'log'
+    operatie = staticmethod(math.log)
     
     #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return DivNode(Constant(1),self.invoer)*self.invoer.dif()
+    def _difKnoop(self, afgeleiden):
+        return DivNode(EEN,self.invoer)*afgeleiden[0]
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _deel(afgeleiden[0], self.invoer)
+
+    def _partieel(self, kinderen, waarde, m):
+        return (1 / kinderen[0],)
 
 #De standaard node is een binarynode, hier zijn de meeste en meest uitgebreidde
 # functionaliteiten te vinden
 class BinaryNode(Expression):
     
     #A node in the expression tree representing a binary operator.
-    def __init__(self, lhs, rhs, op_symbol,precedence,commutatief):
+    # op_symbol, precedence, commutatief, associativiteit en operatie staan op de subclass
+    __slots__ = ('lhs', 'rhs')
+
+    def __init__(self, lhs, rhs):
         self.lhs = lhs
         self.rhs = rhs
-        self.op_symbol = op_symbol
-        self.precedence = precedence
-        self.commutatief = commutatief
 
-    #overloarden bij een gelijk teken
-    def __eq__(self, other):
-        if type(self) == type(other):
-            return self.lhs == other.lhs and self.rhs == other.rhs
-        else:
-            return False
+    #overloarden bij een gelijk teken: hier alleen het type, de zijden vergelijkt Expression.__eq__
+    def _zelfdeKnoop(self, other):
+        return type(self) == type(other)
+
+    def _hashKnoop(self, kinderen):
+        return hash((self.op_symbol, kinderen[0], kinderen[1]))
+
+    # sleutel voor de intern tabel: het type en de al geinterneerde zijden
+    def _internSleutel(self, kinderen):
+        return (type(self), id(kinderen[0]), id(kinderen[1]))
+
+    # de kinderen zijn de linker- en rechterzijde
+    def _kinderen(self):
+        return (self.lhs, self.rhs)
+
+    # dezelfde operatie met andere zijden, als die niet veranderen blijft het deze node
+    def _vervangKinderen(self, kinderen):
+        if kinderen[0] is self.lhs and kinderen[1] is self.rhs:
+            return self
+        return type(self)(kinderen[0], kinderen[1])
    
-    #overloaden van de tostring functie
-    def __str__(self):
-        uitvoer = ""
+    #overloaden van de tostring functie, geeft de stukken tekst en zijden op volgorde
+    def _stukken(self):
+        uitvoer = []
         
         zijde = 0 #administreer of we de linker of rechter zijde bekijken (0 = lhs)
         #ga beide kanten langs en ga na of deze kant haakjes nodig heeft
         
         for side in [self.lhs, self.rhs]:
             
-           
-            # is het een binarynode? bepaal de operatie orde een laag naar beneden en de huidige operatieorde
+            # bepaal de operatie orde een laag naar beneden en de huidige operatieorde
             # bepaal ook of de huidige operatie commutatief is
-            if True:
-                # print(side,"zijde")
-                order_lower = side.precedence
-                order_this = self.precedence
-                this_ass =  self.commutatief
-                
-                
-                #indien ofwel orde 1 laag dieper minder groot is dan de huidige, dan zijn haakjes nodig
-                #haakjes zijn ook nodig als de huidige operatie niet commutatief is 
-                if order_lower < order_this or (not this_ass and order_lower == order_this and zijde ==1):
-                    
-                    uitvoer = uitvoer + "(%s)" % (str(side))
-                    
-                else:
-                    uitvoer = uitvoer + str(side)
+            order_lower = side.precedence
+            order_this = self.precedence
+            this_ass =  self.commutatief
+            
+            #indien ofwel orde 1 laag dieper minder groot is dan de huidige, dan zijn haakjes nodig
+            #haakjes zijn ook nodig als de huidige operatie niet commutatief is 
+            #en links bij een rechts-associatieve operatie, (x ** y) ** z is niet x ** y ** z
+            if order_lower < order_this or (not this_ass and order_lower == order_this and zijde ==1) \
+                    or (self.associativiteit == 1 and order_lower == order_this and zijde == 0):
+                uitvoer.extend(["(", side, ")"])
+            else:
+                uitvoer.append(side)
             
             # als de huidige zijde de lhs is, dan moet het operatiesymbool worden toegevoegd    
             if zijde == 0:
-                uitvoer = uitvoer + " %s " % (self.op_symbol)
+                uitvoer.append(" %s " % (self.op_symbol))
             
             # een optellen om de rhs aan te duiden
             zijde = zijde + 1
             
         return uitvoer
 
-    #Evaluatie functie
-    def evaluate(self, variabelen={}):
+    #Evaluatie functie, kinderen zijn de al geevalueerde lhs en rhs
+    def _evalueer(self, kinderen, variabelen):
         
-        #bepaal de waarden van lhs en de rhs, neem daarin de ingevulde variable waarden mee
-        getal1 = self.lhs.evaluate(variabelen)
-        getal2 = self.rhs.evaluate(variabelen)
+        #de waarden van lhs en de rhs, met de ingevulde variable waarden
+        getal1, getal2 = kinderen
         this_symbol = self.op_symbol
-        this_order = self.precedence 
 
         #Controleren op en verwijderen van nullen in verschillende vormen, en 
         #gevallen iets * 1 -> iets
         welke = 1
 
-        for getal in [getal1, getal2]:
+        for getal, andere in [(getal1, getal2), (getal2, getal1)]:
             #Verwijderen van nullen
-            if getal == Constant(0):
+            if getal == NUL:
                 #Nullen in een + en - worden verwijderd
                 if this_symbol == '+':
-                    return eval("getal" + str(welke%2 + 1))
+                    return andere
                 elif this_symbol == '-':    
                     if welke == 1:
+                        if isinstance(getal2, Constant):
+                            return Constant(-getal2.value)
                         return NegNode(getal2)
                     else:
                         return getal1
                 #bij * en / wordt het 0
                 elif this_symbol == '*':
-                    return Constant(0)
+                    return NUL
                 elif this_symbol == '/':
                     if welke == 1:
-                        return Constant(0)
+                        return NUL
                 #een macht wordt 1 of 0
                 elif this_symbol == '**':
                     if welke == 1:
-                        return Constant(0)
+                        return NUL
                     else:
-                        return Constant(1)
+                        return EEN
             
             #verwijderen van enen
-            elif getal == Constant(1):
+            elif getal == EEN:
                 if this_symbol == '*':
-                    return eval("getal" + str(welke%2 + 1))
+                    return andere
                 elif this_symbol == '/':
                     if welke == 2:
                         return getal1
                 elif this_symbol == '**':
                     if welke == 1:
-                        return Constant(1)
+                        return EEN
                     else:
                         return getal1
             
@@ -511,16 +1917,30 @@ class BinaryNode(Expression):
         #Als een van de twee géén constante is, dan is 1 van de twee ofwel een variabele, ofwel
         #een compound expressie met een variabele er in. Dit kan dan niet als getal geevalueerd worden
         if not isinstance(getal1,Constant):
-            return BinaryNode(getal1,getal2,this_symbol,self.precedence,self.commutatief)
+            return binaire_nodes[this_symbol](getal1,getal2)
         elif not isinstance(getal2,Constant):
-            return BinaryNode(getal1,getal2,this_symbol,self.precedence,self.commutatief)
+            return binaire_nodes[this_symbol](getal1,getal2)
             
         #Wel twee constanten? Voer de operatie uit en maak een nieuwe constante aan
         else:
-            return Constant(eval('%s %s %s' % (getal1.value, self.op_symbol, getal2.value)))
+            return Constant(self.operatie(getal1.value, getal2.value))
+
+    # op de tape komt na beide zijden de operatie (postfix)
+    def _tapeKnoop(self, tape, constanten, variabelen):
+        tape.opcodes.append(tape_opcodes[self.op_symbol])
+        tape.operanden.append(0)
+
+    # array evaluatie: de operatie toepassen op de arrays van beide zijden
+    def _arrayKnoop(self, kinderen, arrays):
+        return self.operatie(kinderen[0], kinderen[1])
+
+    # code voor compile: de code van beide zijden staat er al, nu de operatie zelf
+    def _codeKnoop(self, kinderen, regels, namen):
+        regels.append('t%d = %s %s %s' % (len(regels), kinderen[0], self.op_symbol, kinderen[1]))
+        return 't%d' % (len(regels) - 1)
         
-    #Differentiatie
-    def dif(self, leaf=False):
+    #Differentiatie, afgeleiden zijn de afgeleiden van lhs en rhs
+    def _difKnoop(self, afgeleiden):
         
         order_this = self.precedence
         
@@ -529,22 +1949,23 @@ class BinaryNode(Expression):
         if (self.op_symbol == '**' and not (isinstance(self.lhs,Constant) or isinstance(self.lhs,Variable))):
             macht = PowNode(self.lhs,Constant(self.rhs.value - 1))
             product = MulNode(self.rhs,macht)
-            left = self.lhs.dif()
+            left = afgeleiden[0]
             toreturn = MulNode(product,left)
             
         #Productregel. Analoog aan kettingregel. Eerst f'(x) en g'(x). Dan f(x)g'(x) en f'(x)g(x) en dan 
         # de som
         elif (self.op_symbol == '*' and not (isinstance(self.lhs,Constant) or isinstance(self.rhs,Constant))):
-            afgeleide1 = self.lhs.dif(True)
-            afgeleide2 = self.rhs.dif(True)
+            afgeleide1 = afgeleiden[0]
+            afgeleide2 = afgeleiden[1]
             product1 = MulNode(afgeleide1,self.rhs)
             product2 = MulNode(self.lhs,afgeleide2)
             toreturn = AddNode(product1,product2)
             
         #Geen kettingregel of productregel
+        #Constanten en variabelen worden zelf doorgegeven (zoals dif(False)), de rest als afgeleide
         else:
-            left = self.lhs.dif(False)
-            right = self.rhs.dif(False)
+            left = self.lhs if isinstance(self.lhs,(Constant,Variable)) else afgeleiden[0]
+            right = self.rhs if isinstance(self.rhs,(Constant,Variable)) else afgeleiden[1]
             order_this = self.precedence
             toreturn = False   
 
@@ -553,17 +1974,17 @@ class BinaryNode(Expression):
         if type(toreturn) == bool:
             if isinstance(left,Constant):
                 if order_this == 1:
-                    left = Constant(0)
+                    left = NUL
                 elif order_this == 2 and isinstance(right,Constant): 
-                    toreturn = Constant(0)
+                    toreturn = NUL
                 #elif right is variabele of binarynode, dan niet veranderen    
                 elif order_this == 3:
                     #we staan geen 2^x toe op dit moment, dus is het een getal
-                    toreturn = Constant(0) 
+                    toreturn = NUL 
             elif isinstance(left,Variable):
                 if order_this == 1 or order_this == 2:
                     #we staan nog geen productregel toe, dus rechts is een constante
-                    left = Constant(1)
+                    left = EEN
                 else: #orderthis == 3
                     macht = PowNode(left,Constant(right.value -1))
                     toreturn = MulNode(right,macht)
@@ -572,175 +1993,54 @@ class BinaryNode(Expression):
         if type(toreturn) == bool:
             if isinstance(right,Constant):
                 if order_this == 1:
-                    right = Constant(0)
+                    right = NUL
                 #elif order_this == 3 of 2: dit is al gereturned of hoeft niet veranderd
             elif isinstance(right,Variable):
                 if order_this == 1 or order_this == 2:
-                    right = Constant(1)
+                    right = EEN
                 #else: #orderthis == 3 machtfunctie zijn nog niet toegestaan
         
         # Indien de toreturn niet al is gedefinieed
         if type(toreturn) == bool:
-            toreturn = BinaryNode(left,right,self.op_symbol, self.precedence,self.commutatief)
+            toreturn = binaire_nodes[self.op_symbol](left,right)
         # Eindresultaat teruggeven
         return toreturn
         
         
     
-    #Numerieke integratie
-    def numIntegrate(self,variables,intervals):
-        #voor 1 variabele
-        if isinstance(variables,str):
-            #stapgrootte vastleggen voor 1 variabele
-            steps_per_unit = 1000
-            steps1 = (intervals[1]-intervals[0])*steps_per_unit
-            begin1 = intervals[0]
-            eind1 = intervals[1]
-            ans = 0
-            
-            #trapeziummethode toepassen op alle stapjes
-            for i in range(0,steps1):
-                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                for xpunt in x:
-                    f = self.evaluate({variables:xpunt})
-                    ans += (1/2)*eval('%s' % f)/steps_per_unit
-            
-            return round(ans,3)
-        
-        #voor 1 variabele voor het geval dat deze in een lijst staat
-        elif (isinstance(variables,list) and len(variables)==1):
-            #stapgrootte vastleggen voor 1 variabele
-            steps_per_unit = 1000
-            steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-            begin1 = intervals[0][0]
-            eind1 = intervals[0][1]
-            ans = 0
+    #Nulpunt vinden op gespecificeerd interval
+    # met cache (een EvaluateCache) worden al uitgerekende punten niet opnieuw geevalueerd
+    def findRoot(self,expression,variable,interval,cache=None):
+        #definieren hoe precies het nulpunt moet worden gevonden
+        delta = 0.0001
+
+        #het interval wordt steeds gehalveerd, in een lus in plaats van met recursie
+        while True:
+            #zorgen dat de functie altijd stijgt bekeken van a naar b
+            if getalwaarde(expression,{variable:interval[0]},cache)<getalwaarde(expression,{variable:interval[1]},cache):
+                a = interval[0]
+                b = interval[1]
+            else:
+                a = interval[1]
+                b = interval[0]
             
-            #trapeziummethode toepassen op alle stapjes
-            for i in range(0,steps1):
-                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                for xpunt in x:
-                    f = self.evaluate({variables[0]:xpunt})
-                    ans += (1/2)*eval('%s' % f)/steps_per_unit
+            #middelpunt definieren
+            m = (a+b)/2
             
-            return round(ans,3)
-        
-        #voor meerdere variabelen
-        else:
-            #testen of er een of meerdere getallen in intervals zitten
-            test = []
-            for i in intervals:
-                test.append(isinstance(i,list))
-            if all(test)==False:
-                newfunction = self
-                newvariables = variables
-                newintervals = intervals
-                correction = 0
-                number = 0
-                #nieuwe functie, variabelen en intervallen maken
-                for j in intervals:
-                    if (isinstance(j,int) or isinstance(j,float)):
-                        newfunction = newfunction.evaluate({variables[number]:j})
-                        newvariables.pop(number)
-                        newintervals.pop(number)
-                        correction += 1
-                    number += 1
-                #de functie numIntegrate opnieuw runnen voor de nieuwe functie
-                return newfunction.numIntegrate(newvariables,newintervals)
+            #m als output geven indien het interval te klein is geworden
+            if abs(b-a)<=delta:
+                return m
             
-            #integratie starten voor meerdere variabelen
+            #bekijken aan welke kant van het middelpunt het nulpunt ligt
+            #en verder zoeken in een half zo groot interval
+            if getalwaarde(expression,{variable:m},cache)<=0:
+                interval = [m,b]
             else:
-                #integratie voor twee variabelen
-                if len(variables)==2:
-                    #stapgrootte vastleggen voor 2 variabele
-                    steps_per_unit = 100
-                    
-                    steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-                    begin1 = intervals[0][0]
-                    eind1 = intervals[0][1]
-                    
-                    steps2 = (intervals[1][1]-intervals[1][0])*steps_per_unit
-                    begin2 = intervals[1][0]
-                    eind2 = intervals[1][1]
-                    
-                    ans = 0
-                    #trapeziummethode toepassen op alle stapjes
-                    for i in range(0,steps1):
-                        for j in range(0,steps2):
-                            x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                            y = [begin2+(j*(eind2-begin2))/steps2, begin2+((j+1)*(eind2-begin2))/steps2]
-                            for xpunt in x:
-                                for ypunt in y:
-                                    f = self.evaluate({variables[0]:xpunt,variables[1]:ypunt})
-                                    ans += (1/4)*eval('%s' % f)/(steps_per_unit**2)
-                    
-                    return round(ans,3)
-                
-                #integratie voor drie variabelen
-                elif len(variables)==3:
-                    #stapgrootte vastleggen voor 3 variabele
-                    steps_per_unit = 10
-                    
-                    steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-                    begin1 = intervals[0][0]
-                    eind1 = intervals[0][1]
-                    
-                    steps2 = (intervals[1][1]-intervals[1][0])*steps_per_unit
-                    begin2 = intervals[1][0]
-                    eind2 = intervals[1][1]
-                    
-                    steps3 = (intervals[2][1]-intervals[2][0])*steps_per_unit
-                    begin3 = intervals[2][0]
-                    eind3 = intervals[2][1]
-                    
-                    ans = 0
-                    #trapeziummethode toepassen op alle stapjes
-                    for i in range(0,steps1):
-                        for j in range(0,steps2):
-                            for k in range(0,steps3):
-                                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                                y = [begin2+(j*(eind2-begin2))/steps2, begin2+((j+1)*(eind2-begin2))/steps2]
-                                z = [begin3+(k*(eind3-begin3))/steps3, begin3+((k+1)*(eind3-begin3))/steps3]
-                                for xpunt in x:
-                                    for ypunt in y:
-                                        for zpunt in z:
-                                            f = self.evaluate({variables[0]:xpunt,variables[1]:ypunt,variables[2]:zpunt})
-                                            ans += (1/8)*eval('%s' % f)/(steps_per_unit**3)
-                    
-                    return round(ans,3)
-        
-        return round(ans,3)
-    
-    #Nulpunt vinden op gespecificeerd interval
-    def findRoot(self,expression,variable,interval):
-        #zorgen dat de functie altijd stijgt bekeken van a naar b
-        if expression.evaluate({variable:interval[0]}).constantvalue()<expression.evaluate({variable:interval[1]}).constantvalue():
-            a = interval[0]
-            b = interval[1]
-        else:
-            a = interval[1]
-            b = interval[0]
-        
-        #middelpunt definieren
-        m = (a+b)/2
-        #definieren hoe precies het nulpunt moet worden gevonden
-        delta = 0.0001
-        
-        #m als output geven indien het interval te klein is geworden
-        if abs(b-a)<=delta:
-            return m
-        
-        #bekijken aan welke kant van het middelpunt het nulpunt ligt
-        #de functie findRoot opnieuw runnen voor een half zo groot interval
-        if expression.evaluate({variable:m}).constantvalue()<=0:
-            newinterval = [m,b]
-            return self.findRoot(expression,variable,newinterval)
-        else:
-            newinterval = [a,m]
-            return self.findRoot(expression,variable,newinterval)
+                interval = [a,m]
     
     #Numeriek vergelijkingen oplossen
-    def numSolver(self,left,right,variable,interval):
+    # cache is optioneel een EvaluateCache die ook aan findRoot wordt doorgegeven
+    def numSolver(self,left,right,variable,interval,cache=None):
         #definieren hoe precies nulpunten van elkaar onderscheiden moeten worden
         epsilon = 0.01
         solutions = []
@@ -749,8 +2049,8 @@ class BinaryNode(Expression):
         i = interval[0]
         #findRoot toepassen op alle intervallen die een nulpunt moeten bevatten
         while i+epsilon<=interval[1]:
-            if (nulexpression.evaluate({variable:i}).constantvalue()<=0 and nulexpression.evaluate({variable:i+epsilon}).constantvalue()>=0) or (nulexpression.evaluate({variable:i}).constantvalue()>=0 and nulexpression.evaluate({variable:i+epsilon}).constantvalue()<=0):
-                nul = self.findRoot(nulexpression,variable,[i,i+epsilon])
+            if (getalwaarde(nulexpression,{variable:i},cache)<=0 and getalwaarde(nulexpression,{variable:i+epsilon},cache)>=0) or (getalwaarde(nulexpression,{variable:i},cache)>=0 and getalwaarde(nulexpression,{variable:i+epsilon},cache)<=0):
+                nul = self.findRoot(nulexpression,variable,[i,i+epsilon],cache)
                 solutions.append(nul)
             i += epsilon
         return solutions
@@ -759,53 +2059,849 @@ class BinaryNode(Expression):
 #overloaden van operaties        
 class AddNode(BinaryNode):
     """Represents the addition operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 1 #meegeven van de precendence en associativiteit
-        self.commutatief = True
-        self.op_symbol = '+'
-        self.associativiteit = 0
-        super(AddNode, self).__init__(lhs, rhs,self.op_symbol,self.precedence,self.commutatief)
+    __slots__ = ()
+    precedence = 1 #meegeven van de precendence en associativiteit
+    commutatief = True
+    op_symbol = '+'
+    operatie = staticmethod(operator.add)
+    associativiteit = 0
+
+    # de afgeleiden naar lhs en rhs, in getallen
+    def _partieel(self, kinderen, waarde, m):
+        return (1, 1)
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _som(afgeleiden[0], afgeleiden[1])
     
     
 #onderstaande functies zijn extra maar analoog aan addnode
 class SubNode(BinaryNode):
     """Represents the subtraction operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 1
-        self.commutatief = False
-        self.op_symbol = '-'
-        self.associativiteit = 0
-        super(SubNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
+    __slots__ = ()
+    precedence = 1
+    commutatief = False
+    op_symbol = '-'
+    operatie = staticmethod(operator.sub)
+    associativiteit = 0
+
+    def _partieel(self, kinderen, waarde, m):
+        return (1, -1)
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _verschil(afgeleiden[0], afgeleiden[1])
         
 
 class DivNode(BinaryNode):
     """Represents the division operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 2
-        self.commutatief = False
-        self.op_symbol = '/'
-        self.associativiteit = 0
-        super(DivNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
+    __slots__ = ()
+    precedence = 2
+    commutatief = False
+    op_symbol = '/'
+    operatie = staticmethod(operator.truediv)
+    associativiteit = 0
+
+    def _partieel(self, kinderen, waarde, m):
+        return (1 / kinderen[1], -waarde / kinderen[1])
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _deel(_verschil(_maal(afgeleiden[0], self.rhs), _maal(self.lhs, afgeleiden[1])),
+                     PowNode(self.rhs, Constant(2)))
 
 class MulNode(BinaryNode):
     """Represents the multiplication operator"""
+    __slots__ = ()
+    precedence = 2
+    commutatief = True
+    op_symbol = '*'
+    operatie = staticmethod(operator.mul)
+    associativiteit = 0
 
-    def __init__(self, lhs, rhs):
-        self.precedence = 2
-        self.commutatief = True
-        self.op_symbol = '*'
-        self.associativiteit = 0
-        super(MulNode, self).__init__(lhs, rhs ,self.op_symbol,self.precedence,self.commutatief)
+    def _partieel(self, kinderen, waarde, m):
+        return (kinderen[1], kinderen[0])
+
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        return _som(_maal(afgeleiden[0], self.rhs), _maal(self.lhs, afgeleiden[1]))
 
 class PowNode(BinaryNode):
     """Represents the power operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 3
-        self.commutatief = False
-        self.op_symbol = '**'
-        self.associativiteit = 1
-        super(PowNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
\ No newline at end of file
+    __slots__ = ()
+    precedence = 3
+    commutatief = False
+    op_symbol = '**'
+    operatie = staticmethod(operator.pow)
+    associativiteit = 1
+
+    # naar de exponent is het x ** y * log(x), dat bestaat alleen voor x > 0. Voor andere x
+    # telt die afgeleide niet mee (meestal is de exponent dan toch een constante).
+    def _partieel(self, kinderen, waarde, m):
+        grondtal, exponent = kinderen
+        if exponent == 0:
+            naar_grondtal = 0
+        else:
+            naar_grondtal = exponent * grondtal ** (exponent - 1)
+        if grondtal > 0:
+            return (naar_grondtal, waarde * m.log(grondtal))
+        return (naar_grondtal, 0)
+
+    # (f ** g)' = g * f ** (g - 1) * f' + f ** g * log(f) * g'
+    def _afgeleideKnoop(self, afgeleiden, variabele):
+        grondtal, exponent = afgeleiden
+        if isinstance(self.rhs, Constant):
+            macht = _macht(self.lhs, self.rhs.value - 1)
+        else:
+            macht = PowNode(self.lhs, _verschil(self.rhs, EEN))
+        uitkomst = _maal(_maal(self.rhs, macht), grondtal)
+        if _constante(exponent) != 0:
+            uitkomst = _som(uitkomst, _maal(_maal(self, LogNode(self.lhs)), exponent))
+        return uitkomst
+
+
+# Bouwstenen voor derivative(): een 0 of 1 (NUL, EEN of een gelijke constante) wordt
+# meteen weggewerkt, twee constanten worden uitgerekend. Zo blijven afgeleiden klein.
+def _som(a, b):
+    if _constante(a) == 0:
+        return b
+    if _constante(b) == 0:
+        return a
+    if isinstance(a, Constant) and isinstance(b, Constant):
+        return Constant(a.value + b.value)
+    return AddNode(a, b)
+
+def _verschil(a, b):
+    if _constante(b) == 0:
+        return a
+    if _constante(a) == 0:
+        return _tegengesteld(b)
+    if isinstance(a, Constant) and isinstance(b, Constant):
+        return Constant(a.value - b.value)
+    return SubNode(a, b)
+
+def _maal(a, b):
+    if _constante(a) == 0 or _constante(b) == 0:
+        return NUL
+    if _constante(a) == 1:
+        return b
+    if _constante(b) == 1:
+        return a
+    if isinstance(a, Constant) and isinstance(b, Constant):
+        return Constant(a.value * b.value)
+    return MulNode(a, b)
+
+def _deel(a, b):
+    if _constante(a) == 0:
+        return NUL
+    if _constante(b) == 1:
+        return a
+    return DivNode(a, b)
+
+# a ** getal, met getal een gewoon getal
+def _macht(a, getal):
+    if getal == 0:
+        return EEN
+    if getal == 1:
+        return a
+    return PowNode(a, Constant(getal))
+
+def _tegengesteld(a):
+    if isinstance(a, Constant):
+        return Constant(-a.value)
+    if isinstance(a, NegNode):
+        return a.invoer
+    return NegNode(a)
+
+# De afgeleide van expressie naar variabele. geheugen (een LRUCache) bewaart per (node, variabele) de
+# afgeleide, zodat een deelboom die vaker voorkomt (ook over meerdere aanroepen met hetzelfde
+# geheugen) maar een keer wordt afgeleid. De uitkomst is geinterneerd, dus gelijke deelbomen
+# zijn dezelfde node.
+def _afgeleide(expressie, variabele, geheugen):
+    expressie = intern(expressie)
+    def afleiden(node, afgeleiden):
+        uitkomst = node._afgeleideKnoop(afgeleiden, variabele)
+        geheugen.put_node(node, variabele, uitkomst)
+        return uitkomst
+    return intern(postorder(expressie, afleiden, overslaan=lambda node: geheugen.get_node(node, variabele)))
+
+# Het aantal nodes van de boom (een gedeelde deelboom telt zo vaak als hij voorkomt)
+def aantal_nodes(expressie):
+    return postorder(expressie, lambda node, kinderen: 1 + sum(kinderen))
+
+# Per node (op id) hoe vaak hij in de boom voorkomt. In omgekeerde post-order komt een node
+# na al zijn ouders, dus dan is zijn aantal compleet voor het naar de kinderen gaat.
+# Daarnaast de set nodes die overal waar ze voorkomen een ouder uit dezelfde ketting hebben
+# (zie ketting_regels), bv. de binnenste + van a + b + c.
+def _aantalKeer(expressie, ketens):
+    volgorde = []
+    postorder(expressie, lambda node, kinderen: volgorde.append(node))
+    keer = {id(expressie): 1}
+    inKetting = {}
+    for node in reversed(volgorde):
+        for kind in node._kinderen():
+            keer[id(kind)] = keer.get(id(kind), 0) + keer[id(node)]
+            if any(isinstance(node, soort) and isinstance(kind, soort) for soort in ketens.values()):
+                inKetting[id(kind)] = inKetting.get(id(kind), 0) + keer[id(node)]
+    return keer, {sleutel for sleutel, aantal in inKetting.items() if aantal == keer[sleutel]}
+
+# De regels voor Expression.simplify. Een regel krijgt een node waarvan de kinderen al
+# vereenvoudigd zijn en geeft een nieuwe node terug, of None als hij niets kan doen.
+
+# alle kinderen zijn constanten: uitrekenen (niet als dat een fout of een complex getal geeft)
+def _vouwConstanten(node):
+    kinderen = node._kinderen()
+    if not kinderen or not all(isinstance(kind, Constant) for kind in kinderen):
+        return None
+    try:
+        waarde = node._rekenKnoop([kind.value for kind in kinderen], math)
+    except (ArithmeticError, ValueError):
+        return None
+    if isinstance(waarde, complex):
+        return None
+    return Constant(waarde)
+
+# - - x wordt x
+def _dubbeleNegatie(node):
+    if isinstance(node, NegNode) and isinstance(node.invoer, NegNode):
+        return node.invoer.invoer
+    return None
+
+# de getalwaarde van een constante node, anders None
+def _constante(node):
+    if isinstance(node, Constant):
+        return node.value
+    return None
+
+# x ** 1, x ** 0, 1 ** x, 0 - x en x / 1. Optellen en vermenigvuldigen met 0 en 1 doen
+# _verzamelTermen en _verzamelFactoren.
+def _identiteit(node):
+    if isinstance(node, PowNode):
+        if _constante(node.rhs) == 1:
+            return node.lhs
+        if _constante(node.rhs) == 0 or _constante(node.lhs) == 1:
+            return EEN
+    elif isinstance(node, SubNode) and _constante(node.lhs) == 0:
+        return NegNode(node.rhs)
+    elif isinstance(node, DivNode) and _constante(node.rhs) == 1:
+        return node.lhs
+    return None
+
+# een getal als int als dat zonder verlies kan, een breuk die geen geheel getal is wordt een
+# float (er komt nooit een Fraction in een Constant)
+def _geheel(getal):
+    if isinstance(getal, fractions.Fraction):
+        if getal.denominator == 1:
+            return int(getal)
+        return float(getal)
+    if isinstance(getal, float) and getal.is_integer() and abs(getal) < 2 ** 53:
+        return int(getal)
+    return getal
+
+# Schrijf een product (*, /, negatie, machten met een constante exponent) als
+# coefficient * factor1 ** exponent1 * ... De factoren staan in de volgorde waarin ze
+# voorkomen, gelijke factoren zijn samengenomen: x * y / x ** 3 is 1, {x: -2, y: 1}.
+# Een gehele exponent van een product wordt over de factoren verdeeld, (x * y) ** 2 = x**2 * y**2,
+# maar alleen tot max_macht: (x / 18) ** 4782969 uitschrijven kost meer dan het oplevert.
+max_macht = 64
+
+def _factoren(node):
+    coefficient = fractions.Fraction(1)
+    factoren = collections.OrderedDict()
+    stack = [(node, 1)]
+    while stack:
+        node, macht = stack.pop()
+        if isinstance(node, Constant):
+            waarde = node.value
+            if isinstance(waarde, int):
+                waarde = fractions.Fraction(waarde)
+            coefficient = coefficient * waarde ** macht
+        elif isinstance(node, NegNode):
+            coefficient = coefficient * (-1) ** macht
+            stack.append((node.invoer, macht))
+        elif isinstance(node, MulNode):
+            stack.append((node.rhs, macht))
+            stack.append((node.lhs, macht))
+        elif isinstance(node, DivNode):
+            stack.append((node.rhs, -macht))
+            stack.append((node.lhs, macht))
+        elif isinstance(node, PowNode) and isinstance(node.rhs, Constant) \
+                and isinstance(_geheel(node.rhs.value), int) and abs(macht * node.rhs.value) <= max_macht:
+            stack.append((node.lhs, macht * _geheel(node.rhs.value)))
+        elif isinstance(node, PowNode) and isinstance(node.rhs, Constant):
+            factoren[node.lhs] = factoren.get(node.lhs, 0) + macht * node.rhs.value
+        else:
+            factoren[node] = factoren.get(node, 0) + macht
+    return coefficient, [(factor, macht) for factor, macht in factoren.items() if macht != 0]
+
+# Bouw coefficient * factoren (zoals van _factoren) weer op: eerst het getal, dan de
+# factoren met een positieve exponent, gedeeld door de rest. Een negatief getal wordt een negatie.
+def _product(coefficient, factoren):
+    teken = coefficient < 0
+    coefficient = abs(coefficient)
+    teller = []
+    noemer = []
+    if isinstance(coefficient, fractions.Fraction):
+        if coefficient.numerator != 1 or not any(macht > 0 for factor, macht in factoren):
+            teller.append(Constant(coefficient.numerator))
+        if coefficient.denominator != 1:
+            noemer.append(Constant(coefficient.denominator))
+    elif coefficient != 1 or not any(macht > 0 for factor, macht in factoren):
+        teller.append(Constant(_geheel(coefficient)))
+    for factor, macht in factoren:
+        lijst = teller if macht > 0 else noemer
+        macht = _geheel(abs(macht))
+        lijst.append(factor if macht == 1 else PowNode(factor, Constant(macht)))
+
+    uitkomst = teller[0]
+    for factor in teller[1:]:
+        uitkomst = MulNode(uitkomst, factor)
+    if noemer:
+        deler = noemer[0]
+        for factor in noemer[1:]:
+            deler = MulNode(deler, factor)
+        uitkomst = DivNode(uitkomst, deler)
+    if teken:
+        uitkomst = NegNode(uitkomst)
+    return uitkomst
+
+# Vermenigvuldigen en delen: constanten samen in een getal en gelijke factoren samen in een
+# macht, x * 2 * x / 4 wordt x ** 2 / 2. Vermenigvuldigen met 0 geeft 0.
+def _verzamelFactoren(node):
+    if not isinstance(node, (MulNode, DivNode, PowNode)):
+        return None
+    try:
+        coefficient, factoren = _factoren(node)
+    except (ArithmeticError, ValueError):
+        return None
+    if coefficient == 0:
+        return NUL
+    nieuw = _product(coefficient, factoren)
+    if nieuw == node:
+        return None
+    return nieuw
+
+# Optellen en aftrekken: alle constanten samen in een getal vooraan en gelijke termen samen,
+# 1 + x + 18 wordt 19 + x en 2 * x - x / 2 wordt 3 * x / 2. Termen die wegvallen verdwijnen.
+def _verzamelTermen(node):
+    if not isinstance(node, (AddNode, SubNode)):
+        return None
+    termen = collections.OrderedDict()
+    stack = [(node, 1)]
+    try:
+        while stack:
+            term, teken = stack.pop()
+            if isinstance(term, AddNode):
+                stack.append((term.rhs, teken))
+                stack.append((term.lhs, teken))
+            elif isinstance(term, SubNode):
+                stack.append((term.rhs, -teken))
+                stack.append((term.lhs, teken))
+            elif isinstance(term, NegNode):
+                stack.append((term.invoer, -teken))
+            else:
+                coefficient, factoren = _factoren(term)
+                sleutel = frozenset(factoren)
+                if sleutel in termen:
+                    termen[sleutel][0] += teken * coefficient
+                else:
+                    termen[sleutel] = [teken * coefficient, factoren]
+    except (ArithmeticError, ValueError):
+        return None
+
+    constante = termen.pop(frozenset(), [0])[0]
+    uitkomst = None
+    if constante != 0:
+        uitkomst = Constant(_geheel(constante))
+    for coefficient, factoren in termen.values():
+        if coefficient == 0:
+            continue
+        if uitkomst is None:
+            uitkomst = _product(coefficient, factoren)
+        elif coefficient < 0:
+            uitkomst = SubNode(uitkomst, _product(-coefficient, factoren))
+        else:
+            uitkomst = AddNode(uitkomst, _product(coefficient, factoren))
+    if uitkomst is None:
+        uitkomst = NUL
+    if uitkomst == node:
+        return None
+    return uitkomst
+
+# op volgorde: de eerste regel die iets doet wint, daarna komt de node opnieuw aan de beurt
+simplify_regels = [
+    ('constanten', _vouwConstanten),
+    ('dubbele negatie', _dubbeleNegatie),
+    ('identiteit', _identiteit),
+    ('termen', _verzamelTermen),
+    ('factoren', _verzamelFactoren),
+]
+
+# Regels die een hele ketting van deze nodes in een keer verzamelen. Ze hoeven alleen bij de
+# bovenste node van de ketting te kijken, die van de nodes eronder doet de bovenste toch over.
+ketting_regels = {
+    _verzamelTermen: (AddNode, SubNode),
+    _verzamelFactoren: (MulNode, DivNode),
+}
+
+
+# Een Pratt parser (precedence climbing): expressie(minimum) leest een operand en blijft
+# daarna binaire operatoren toevoegen zolang hun precedence minstens minimum is. De rechterkant
+# van een links-associatieve operator moet sterker binden (precedence + 1), die van een
+# rechts-associatieve operator mag even sterk binden. Een min waar een operand hoort is een
+# negatie met de precedence van NegNode, dus -x**2 is -(x**2) en -x*y is (-x)*y.
+# Alle precedences komen uit order_op, dus uit de node classes zelf.
+# In plaats van recursie houdt expressie() zelf een stack bij van wat nog op een operand wacht
+# (een operator met zijn linkerkant, een negatie of een '('), zo kan x**x**...**x of een
+# formule met duizenden haakjes diep geen RecursionError geven.
+class PrattParser():
+
+    def __init__(self, string):
+        self.string = string
+        self.tokens = scan(string)
+        self.i = 0
+
+    # het volgende token zonder het te gebruiken, None aan het einde
+    def kijk(self):
+        if self.i < len(self.tokens):
+            return self.tokens[self.i]
+        return None
+
+    # de positie van het volgende token, voor foutmeldingen
+    def positie(self):
+        token = self.kijk()
+        if token is None:
+            return len(self.string)
+        return token.positie
+
+    def parse(self):
+        boom = self.expressie(0)
+        token = self.kijk()
+        if token is not None:
+            if token.tekst == ')':
+                raise ParseError("')' zonder '('", token.positie)
+            if token.soort == 'komma':
+                raise ParseError("onverwachte komma", token.positie)
+            raise ParseError("operator verwacht voor %r" % token.tekst, token.positie)
+        return boom
+
+    def expressie(self, minimum):
+        # per wachtend stuk: ('binair', linkerkant, operator, minimum), ('neg', minimum) of
+        # ('haakjes', functie node of None, minimum)
+        wachtend = []
+        while True:
+            links = self.operand(wachtend, minimum)
+            if links is None:
+                # er staat een negatie of '(' op de stack, daarbinnen begint een nieuwe expressie
+                minimum = NegNode.precedence if wachtend[-1][0] == 'neg' else 0
+                continue
+            while True:
+                token = self.kijk()
+                if token is not None and token.soort == 'operator':
+                    precedence, associativiteit = order_op[token.tekst]
+                    if precedence >= minimum:
+                        self.i += 1
+                        wachtend.append(('binair', links, token.tekst, minimum))
+                        minimum = precedence + 1 if associativiteit == 0 else precedence
+                        break
+                # deze (deel)expressie is klaar, geef hem aan wat erop wacht
+                if not wachtend:
+                    return links
+                stuk = wachtend.pop()
+                minimum = stuk[-1]
+                if stuk[0] == 'binair':
+                    links = binaire_nodes[stuk[2]](stuk[1], links)
+                elif stuk[0] == 'neg':
+                    links = NegNode(links)
+                else:
+                    self.sluitHaakje()
+                    if stuk[1] is not None:
+                        links = stuk[1](links)
+
+    # een getal of variabele. Bij een negatie, '(' of functie komt die op de stack wachtend en
+    # is de uitkomst None, de operand begint dan pas na dat token.
+    def operand(self, wachtend, minimum):
+        token = self.kijk()
+        if token is None:
+            raise ParseError("formule is onvolledig", len(self.string))
+        soort, tekst, positie = token
+        self.i += 1
+
+        if soort == 'getal':
+            return Constant(tekst_naar_getal(tekst))
+        if soort == 'naam':
+            if tekst not in functie_nodes:
+                return Variable(tekst)
+            volgende = self.kijk()
+            if volgende is None or volgende.tekst != '(':
+                raise ParseError("'(' verwacht na %s" % tekst, positie)
+            self.i += 1
+            wachtend.append(('haakjes', functie_nodes[tekst], minimum))
+            return None
+        if tekst == '-':
+            wachtend.append(('neg', minimum))
+            return None
+        if tekst == '(':
+            wachtend.append(('haakjes', None, minimum))
+            return None
+        raise ParseError("getal of variabele verwacht voor %r" % tekst, positie)
+
+    # na iets tussen haakjes moet de ')' komen
+    def sluitHaakje(self):
+        token = self.kijk()
+        if token is None:
+            raise ParseError("'(' wordt niet gesloten", len(self.string))
+        if token.tekst != ')':
+            if token.soort == 'komma':
+                raise ParseError("onverwachte komma", token.positie)
+            raise ParseError("operator verwacht voor %r" % token.tekst, token.positie)
+        self.i += 1
+
+
+# Een expressie als "tape": de boom in RPN volgorde, opgeslagen als platte arrays.
+# opcodes[i] zegt wat stap i doet; bij OP_CONST en OP_VAR geeft operanden[i] de index
+# in de lijst constanten of variabelen. Een node kost zo 1 + 4 bytes in plaats van een
+# heel Python object, en evalueren is een enkele lus met een stack, zonder recursie.
+class Tape():
+
+    def __init__(self):
+        self.opcodes = array.array('B')
+        self.operanden = array.array('I')
+        self.constanten = []
+        self.variabelen = []
+
+    # het aantal nodes op de tape
+    def __len__(self):
+        return len(self.opcodes)
+
+    # Evalueer de tape voor de gegeven waarden van de variabelen, geeft een getal terug.
+    # Alle variabelen op de tape moeten een waarde hebben.
+    def evaluate(self, variabelen={}):
+        waarden = []
+        for teken in self.variabelen:
+            if teken not in variabelen:
+                raise ValueError("variabele '%s' heeft geen waarde gekregen" % teken)
+            waarden.append(variabelen[teken])
+        constanten = self.constanten
+
+        stack = []
+        for opcode, operand in zip(self.opcodes, self.operanden):
+            if opcode == OP_CONST:
+                stack.append(constanten[operand])
+            elif opcode == OP_VAR:
+                stack.append(waarden[operand])
+            elif opcode in tape_binair:
+                rechts = stack.pop()
+                stack[-1] = tape_binair[opcode](stack[-1], rechts)
+            else:
+                stack[-1] = tape_unair[opcode](stack[-1])
+        return stack[0]
+
+    # Binaire vorm, alles little-endian:
+    #   kop: b'EXPR', versie, 3 lege bytes, aantal nodes, aantal constanten, aantal variabelen
+    #   de opcodes (1 byte per node, aangevuld tot een veelvoud van 4)
+    #   de operanden (4 bytes per node)
+    #   de constanten: b'i' en een 64 bits integer, b'd' en een double, of voor grotere gehele
+    #   getallen b'g', 4 bytes lengte en het getal (two's complement)
+    #   de namen van de variabelen: 2 bytes lengte en de naam in utf-8
+    def dumps(self):
+        stukken = [tape_kop.pack(TAPE_MAGIC, TAPE_VERSIE, len(self.opcodes),
+                                 len(self.constanten), len(self.variabelen))]
+        stukken.append(bytes(self.opcodes))
+        stukken.append(bytes(-len(self.opcodes) % 4))
+        operanden = array.array('I', self.operanden)
+        if sys.byteorder != 'little':
+            operanden.byteswap()
+        stukken.append(operanden.tobytes())
+        for waarde in self.constanten:
+            if isinstance(waarde, int) and -2**63 <= waarde < 2**63:
+                stukken.append(struct.pack('<cq', b'i', waarde))
+            elif isinstance(waarde, int):
+                getal = waarde.to_bytes(waarde.bit_length() // 8 + 1, 'little', signed=True)
+                stukken.append(struct.pack('<cI', b'g', len(getal)))
+                stukken.append(getal)
+            elif isinstance(waarde, float):
+                stukken.append(struct.pack('<cd', b'd', waarde))
+            else:
+                raise ValueError("constante %r kan niet worden opgeslagen" % (waarde,))
+        for teken in self.variabelen:
+            naam = teken.encode('utf-8')
+            stukken.append(struct.pack('<H', len(naam)))
+            stukken.append(naam)
+        return b''.join(stukken)
+
+    # Een tape uit bytes van dumps(), vanaf offset. Op een little-endian machine zijn opcodes en
+    # operanden memoryviews op data zelf, dus bij een mmap wordt er niets gekopieerd.
+    # Afgekapte of beschadigde data geeft een ValueError: alle lengtes worden nagelopen, en elke
+    # opcode en index moet bestaan en samen een geldige RPN vormen.
+    @staticmethod
+    def loads(data, offset=0):
+        data = memoryview(data)
+        def controleer(einde):
+            if einde > len(data):
+                raise ValueError("expressie op positie %d is afgekapt" % offset)
+        try:
+            magic, versie, aantal, aantal_constanten, aantal_variabelen = tape_kop.unpack_from(data, offset)
+        except struct.error:
+            raise ValueError("geen expressie op positie %d" % offset)
+        if magic != TAPE_MAGIC:
+            raise ValueError("geen expressie op positie %d" % offset)
+        if versie != TAPE_VERSIE:
+            raise ValueError("onbekende versie %d van het expressieformaat" % versie)
+
+        tape = Tape()
+        positie = offset + tape_kop.size
+        controleer(positie + aantal + (-aantal % 4) + 4 * aantal)
+        tape.opcodes = data[positie:positie + aantal]
+        positie += aantal + (-aantal % 4)
+        operanden = data[positie:positie + 4 * aantal]
+        if sys.byteorder == 'little' and array.array('I').itemsize == 4:
+            tape.operanden = operanden.cast('I')
+        else:
+            tape.operanden = array.array('I')
+            tape.operanden.frombytes(operanden)
+            if sys.byteorder != 'little':
+                tape.operanden.byteswap()
+        positie += 4 * aantal
+
+        for i in range(aantal_constanten):
+            controleer(positie + 9)
+            if data[positie] == ord('i'):
+                soort, waarde = struct.unpack_from('<cq', data, positie)
+                positie += 9
+            elif data[positie] == ord('d'):
+                soort, waarde = struct.unpack_from('<cd', data, positie)
+                positie += 9
+            elif data[positie] == ord('g'):
+                soort, lengte = struct.unpack_from('<cI', data, positie)
+                controleer(positie + 5 + lengte)
+                waarde = int.from_bytes(data[positie + 5:positie + 5 + lengte], 'little', signed=True)
+                positie += 5 + lengte
+            else:
+                raise ValueError("onbekend soort constante op positie %d" % positie)
+            tape.constanten.append(waarde)
+        for i in range(aantal_variabelen):
+            controleer(positie + 2)
+            lengte, = struct.unpack_from('<H', data, positie)
+            controleer(positie + 2 + lengte)
+            tape.variabelen.append(str(data[positie + 2:positie + 2 + lengte], 'utf-8'))
+            positie += 2 + lengte
+
+        # diepte is het aantal waarden op de stack, aan het eind moet er precies een over zijn
+        diepte = 0
+        for opcode, operand in zip(tape.opcodes, tape.operanden):
+            if opcode == OP_CONST:
+                goed = operand < aantal_constanten
+                diepte += 1
+            elif opcode == OP_VAR:
+                goed = operand < aantal_variabelen
+                diepte += 1
+            elif opcode in tape_binair:
+                goed = diepte >= 2
+                diepte -= 1
+            else:
+                goed = opcode in tape_unair and diepte >= 1
+            if not goed:
+                raise ValueError("beschadigde expressie op positie %d" % offset)
+        if diepte != 1:
+            raise ValueError("beschadigde expressie op positie %d" % offset)
+        return tape
+
+    # Zet de tape terug om in een expressieboom
+    def to_expression(self):
+        stack = []
+        for opcode, operand in zip(self.opcodes, self.operanden):
+            if opcode == OP_CONST:
+                stack.append(Constant(self.constanten[operand]))
+            elif opcode == OP_VAR:
+                stack.append(Variable(self.variabelen[operand]))
+            elif opcode in tape_binair:
+                rechts = stack.pop()
+                stack[-1] = tape_nodes[opcode](stack[-1], rechts)
+            else:
+                stack[-1] = tape_nodes[opcode](stack[-1])
+        return stack[0]
+
+
+# Een bestand met veel expressies in de binaire vorm van Tape.dumps, gelezen via mmap zodat
+# processen die hetzelfde bestand openen het geheugen delen. Het bestand is b'EXPL', een versie,
+# de expressies (elk begint op een veelvoud van 8), een tabel met hun posities en aan het eind
+# de positie van die tabel en het aantal expressies.
+# Maken:   ExpressionLibrary.write('formules.expl', expressies)
+# Lezen:   with ExpressionLibrary('formules.expl') as bibliotheek: bibliotheek[3], bibliotheek.tape(3)
+class ExpressionLibrary():
+
+    def __init__(self, pad):
+        self.bestand = open(pad, 'rb')
+        try:
+            self.data = mmap.mmap(self.bestand.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # een leeg bestand kan niet gemapt worden
+            self.bestand.close()
+            raise ValueError("%s is geen expressiebibliotheek" % pad)
+        if len(self.data) < 20:
+            self.close()
+            raise ValueError("%s is afgekapt" % pad)
+        if self.data[:4] != LIBRARY_MAGIC:
+            self.close()
+            raise ValueError("%s is geen expressiebibliotheek" % pad)
+        if self.data[4] != TAPE_VERSIE:
+            self.close()
+            raise ValueError("onbekende versie %d van het expressieformaat" % self.data[4])
+        tabel, self.aantal = struct.unpack_from('<QI', self.data, len(self.data) - 12)
+        if tabel + 8 * self.aantal > len(self.data) - 12:
+            self.close()
+            raise ValueError("%s is afgekapt" % pad)
+        self.tabel = tabel
+
+    # Schrijf de expressies (of tapes) naar pad, een voor een
+    @staticmethod
+    def write(pad, expressies):
+        posities = []
+        with open(pad, 'wb') as bestand:
+            bestand.write(LIBRARY_MAGIC + bytes([TAPE_VERSIE]) + bytes(3))
+            positie = 8
+            for expressie in expressies:
+                data = expressie.dumps()
+                posities.append(positie)
+                data += bytes(-len(data) % 8)
+                bestand.write(data)
+                positie += len(data)
+            bestand.write(struct.pack('<%dQ' % len(posities), *posities))
+            bestand.write(struct.pack('<QI', positie, len(posities)))
+
+    def __len__(self):
+        return self.aantal
+
+    # de expressie met nummer i als boom
+    def __getitem__(self, i):
+        return self.tape(i).to_expression()
+
+    # de expressie met nummer i als Tape, zonder kopie van de opcodes en operanden.
+    # Zo'n tape blijft bruikbaar na close(), de mmap gaat pas dicht als de tape weg is.
+    def tape(self, i):
+        if i < 0:
+            i += self.aantal
+        if not 0 <= i < self.aantal:
+            raise IndexError("expressie %d bestaat niet" % i)
+        positie, = struct.unpack_from('<Q', self.data, self.tabel + 8 * i)
+        return Tape.loads(self.data, positie)
+
+    def __iter__(self):
+        for i in range(self.aantal):
+            yield self[i]
+
+    def close(self):
+        try:
+            self.data.close()
+        except BufferError:
+            # er bestaat nog een tape() op de mmap, die houdt hem vast tot hij zelf weg is
+            pass
+        self.bestand.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *fout):
+        self.close()
+
+
+# de constanten 0 en 1 komen zo vaak voor dat iedereen dezelfde twee objecten gebruikt
+NUL = intern(Constant(0))
+EEN = intern(Constant(1))
+
+# de node class per operatiesymbool, gebruikt door fromString, evaluate en dif
+binaire_nodes = {'+': AddNode, '-': SubNode, '*': MulNode, '/': DivNode, '**': PowNode}
+
+# de parsertabellen, rechtstreeks uit de class gegevens van de nodes
+for _node in list(binaire_nodes.values()) + [NegNode]:
+    order_op[_node.op_symbol] = (_node.precedence, _node.associativiteit)
+for _node in [SinNode, CosNode, ExpNode, LogNode, TanNode]:
+    functie_nodes[_node.func_symbol] = _node
+
+# per opcode de bijbehorende rekenfunctie en node class
+tape_binair = {}
+tape_unair = {OP_NEG: operator.neg}
+tape_nodes = {OP_NEG: NegNode}
+for _symbool, _node in binaire_nodes.items():
+    tape_binair[tape_opcodes[_symbool]] = bewerkingen[_symbool]
+    tape_nodes[tape_opcodes[_symbool]] = _node
+for _symbool, _node in [('sin', SinNode), ('cos', CosNode), ('tan', TanNode), ('exp', ExpNode), ('log', LogNode)]:
+    tape_unair[tape_opcodes[_symbool]] = compile_functies[_symbool]
+    tape_nodes[tape_opcodes[_symbool]] = _node
+
+
+# Een resultaat van parse_many: het regelnummer (vanaf 1), de tekst van de regel, de boom
+# (of Tape) en een foutmelding. Als de regel niet te lezen was is expressie None en fout de melding.
+ParseResult = collections.namedtuple('ParseResult', ['regel', 'tekst', 'expressie', 'fout'])
+
+# lees een stuk (regelnummer, tekst) paren, een fout in een regel stopt de rest niet.
+# Met binair=True komen de uitkomsten als bytes van Tape.dumps terug, een diepe boom kan
+# niet door pickle (RecursionError), de bytes wel. Zie _vanBinair.
+def _parse_blok(blok, tape=False, binair=False):
+    resultaten = []
+    for regel, tekst in blok:
+        try:
+            expressie = Expression.parse(tekst)
+            if binair:
+                expressie = expressie.to_tape().dumps()
+            elif tape:
+                expressie = expressie.to_tape()
+            resultaten.append(ParseResult(regel, tekst, expressie, None))
+        except (ParseError, RecursionError) as fout:
+            resultaten.append(ParseResult(regel, tekst, None, str(fout)))
+    return resultaten
+
+# de bytes uit _parse_blok(..., binair=True) terug naar een Tape of een boom
+def _vanBinair(resultaten, tape=False):
+    for resultaat in resultaten:
+        if resultaat.fout is None:
+            expressie = Tape.loads(resultaat.expressie)
+            if not tape:
+                expressie = expressie.to_expression()
+            resultaat = resultaat._replace(expressie=expressie)
+        yield resultaat
+
+# de niet-lege regels in stukken van chunksize (regelnummer, tekst) paren
+def _blokken(regels, chunksize):
+    blok = []
+    for regel, tekst in enumerate(regels, 1):
+        tekst = tekst.strip()
+        if not tekst:
+            continue
+        blok.append((regel, tekst))
+        if len(blok) >= chunksize:
+            yield blok
+            blok = []
+    if blok:
+        yield blok
+
+# Lees veel formules, een per regel. bron is een bestandsnaam (str of Path) of iets waar je overheen kan lopen
+# (een open bestand, een lijst strings). Geeft per niet-lege regel een ParseResult terug, in de
+# volgorde van de bron, en houdt nooit meer dan een paar stukken van chunksize regels in het geheugen.
+# Met tape=True komt er een Tape in plaats van een boom. Met processes (een aantal, of True voor
+# het aantal cpu's) worden de stukken parallel in een process pool gelezen.
+def parse_many(bron, tape=False, processes=None, chunksize=256):
+    if isinstance(bron, (str, os.PathLike)):
+        with open(bron) as bestand:
+            for resultaat in parse_many(bestand, tape, processes, chunksize):
+                yield resultaat
+        return
+
+    blokken = _blokken(bron, chunksize)
+    if not processes:
+        for blok in blokken:
+            for resultaat in _parse_blok(blok, tape):
+                yield resultaat
+        return
+
+    if processes is True:
+        processes = os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        # hoogstens twee stukken per proces tegelijk onderweg, de uitkomsten in volgorde van de bron
+        onderweg = collections.deque()
+        maximum = 2 * processes
+        for blok in blokken:
+            onderweg.append(pool.submit(_parse_blok, blok, tape, True))
+            if len(onderweg) >= maximum:
+                for resultaat in _vanBinair(onderweg.popleft().result(), tape):
+                    yield resultaat
+        while onderweg:
+            for resultaat in _vanBinair(onderweg.popleft().result(), tape):
+                yield resultaat
@@ -1,791 +1,706 @@
+# Regressietests voor expression.py. Draaien met:
+#     python -m pytest -q test.py
+# of zonder pytest met python test.py
 import math
+import pathlib
+import random
+import re
 import sys
-import itertools
-import copy
-
-
-def tokenize(string):
-    #split a string into mathematical tokens
-    #returns a list of numbers, operators, parantheses and commas
-    #output will not contain spaces
-    
-    splitchars = list("+-*/(),")
-
-    # surround any splitchar by spaces
-    tokenstring = []
-    for c in string:
-        if c in splitchars:
-            tokenstring.append(' %s ' % c)
+import tempfile
+
+from expression import *
+
+
+# een willekeurige boom met variabelen x, y en z, hoogstens diepte lagen diep
+def willekeurige_boom(rnd, diepte):
+    if diepte == 0 or rnd.random() < 0.2:
+        if rnd.random() < 0.5:
+            return Constant(rnd.randrange(20))
+        return Variable(rnd.choice('xyz'))
+    keuze = rnd.random()
+    if keuze < 0.15:
+        return NegNode(willekeurige_boom(rnd, diepte - 1))
+    if keuze < 0.3:
+        functie = functie_nodes[rnd.choice(sorted(functie_nodes))]
+        return functie(willekeurige_boom(rnd, diepte - 1))
+    node = binaire_nodes[rnd.choice(sorted(binaire_nodes))]
+    return node(willekeurige_boom(rnd, diepte - 1), willekeurige_boom(rnd, diepte - 1))
+
+# vaste willekeurige bomen met hun tekst, per seed altijd dezelfde
+def corpus(aantal, diepte=6, seed=0):
+    rnd = random.Random(seed)
+    return [(boom, str(boom)) for boom in (willekeurige_boom(rnd, diepte) for i in range(aantal))]
+
+# vaste waarden voor de variabelen van het corpus
+punt = {'x': 0.7, 'y': 1.3, 'z': 2.1}
+
+# de rekenfuncties zoals Python ze kent, om de tekst van een formule met eval uit te rekenen
+python_functies = {'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'exp': math.exp, 'log': math.log}
+
+# a en b zijn gelijk op afronding na
+def dichtbij(a, b, rtol=1e-7, atol=1e-9):
+    return abs(a - b) <= atol + rtol * max(abs(a), abs(b))
+
+# de waarde van een formule met eval, None als Python er niets van kan maken
+def python_waarde(tekst, variabelen):
+    omgeving = dict(python_functies)
+    omgeving.update(variabelen)
+    try:
+        waarde = eval(tekst, omgeving)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    if isinstance(waarde, complex) or not math.isfinite(waarde):
+        return None
+    return waarde
+
+# de tekst met alle gehele getallen als float: in het corpus staan machten als 18 ** (5 ** 13),
+# die zijn met gehele getallen onuitrekenbaar groot en met floats gewoon een OverflowError
+def drijvend(tekst):
+    return re.sub(r'\b(\d+)\b', r'\1.0', tekst)
+
+# of er na het uitrekenen van de constanten geen enorm getal overblijft: in 18 ** 17 + 4 * x
+# verdwijnt 4 * x in de afronding, dan ziet een differentie x niet meer
+def gewone_getallen(expressie):
+    return postorder(expressie.evaluate({}), lambda node, kinderen: all(kinderen) and
+                     not (isinstance(node, Constant) and abs(node.value) > 1e8))
+
+# of de waarde nauwelijks verandert als alle variabelen een heel klein beetje veranderen,
+# anders (bv. tan van een enorm getal) mogen twee manieren van uitrekenen flink verschillen
+def stabiel(tekst, variabelen):
+    waarde = python_waarde(tekst, variabelen)
+    verschoven = python_waarde(tekst, {teken: w * (1 + 1e-12) for teken, w in variabelen.items()})
+    return waarde is not None and verschoven is not None and dichtbij(waarde, verschoven, rtol=1e-8)
+
+# centrale differentie van f (een functie van een getal) in x
+def differentie(f, x, h=1e-6):
+    return (f(x + h) - f(x - h)) / (2 * h)
+
+# of dif() de boom aankan: machten en delingen alleen met een getal rechts (de quotientregel
+# van dif klopt niet, zie derivative())
+def dif_kan(boom):
+    return postorder(boom, lambda node, kinderen: all(kinderen) and
+                     not (isinstance(node, (PowNode, DivNode)) and not isinstance(node.rhs, Constant)))
+
+# vaste formules in x, y en z (te berekenen in punt)
+formules = ['sin(x)*x**2 + 3*y - exp(x/4) + log(x)*tan(y) + cos(2.5)',
+            'x*y*z + x/(y-z) - (x-y)-z', '-(x+1)*3', '(x+1)**2 / (1 + x*x)',
+            'sin(x*y)*cos(x*y)', 'exp(-x) * log(y + x)', '2**x + x**y']
+
+
+def test_tekst_en_fromstring():
+    for boom, tekst in corpus(500, seed=1):
+        assert str(Expression().fromString(tekst)) == tekst
+        assert Expression().fromString(tekst) == Expression().fromString(tekst)
+        assert hash(Expression().fromString(tekst)) == hash(Expression().fromString(tekst))
+
+def test_evaluate_zoals_python():
+    getest = 0
+    for boom, tekst in corpus(500, seed=2):
+        tekst = drijvend(tekst)
+        verwacht = python_waarde(tekst, punt)
+        if verwacht is None:
+            continue
+        uitkomst = Expression().fromString(tekst).evaluate(punt)
+        assert isinstance(uitkomst, Constant), tekst
+        assert dichtbij(uitkomst.value, verwacht), tekst
+        # gedeeltelijk invullen en daarna de rest geeft hetzelfde
+        deels = Expression().fromString(tekst).evaluate({'x': punt['x']})
+        assert dichtbij(deels.evaluate(punt).value, verwacht), tekst
+        getest += 1
+    assert getest > 250
+
+# dif() leidt af naar alle variabelen tegelijk (elke variabele heeft afgeleide 1), dus de
+# differentie schuift x, y en z samen op
+def test_dif_zoals_differentie():
+    getest = 0
+    for boom, tekst in corpus(500, seed=4):
+        if not dif_kan(boom):
+            continue
+        tekst = drijvend(tekst)
+        f = lambda h: python_waarde(tekst, {teken: waarde + h for teken, waarde in punt.items()})
+        if None in (f(-1e-6), f(0), f(1e-6)):
+            continue
+        verwacht = differentie(f, 0)
+        # snel varierende formules (cos van iets groots) kun je zo niet numeriek afleiden
+        if abs(verwacht) > 1e6 or not dichtbij(verwacht, differentie(f, 0, 1e-5), rtol=1e-3, atol=1e-5):
+            continue
+        expressie = Expression().fromString(tekst)
+        if not gewone_getallen(expressie):
+            continue
+        try:
+            afgeleide = expressie.dif().evaluate(punt).value
+        except (ValueError, ZeroDivisionError):
+            continue
+        assert dichtbij(afgeleide, verwacht, rtol=1e-4, atol=1e-5), tekst
+        getest += 1
+    assert getest > 100
+
+def test_diepe_som():
+    som = Variable('x')
+    for i in range(4999):
+        som = som + Variable('x')
+    tekst = str(som)
+    assert tekst == ' + '.join(['x'] * 5000)
+    assert Expression().fromString(tekst) == som
+    assert hash(Expression().fromString(tekst)) == hash(som)
+    assert som.evaluate({'x': 2}) == Constant(10000)
+    assert som.dif().evaluate({'x': 2}).value == 5000
+
+def test_compile_zoals_python():
+    getest = 0
+    for boom, tekst in corpus(300, seed=3):
+        tekst = drijvend(tekst)
+        verwacht = python_waarde(tekst, punt)
+        if verwacht is None:
+            continue
+        functie = Expression().fromString(tekst).compile(['x', 'y', 'z'])
+        assert dichtbij(functie(punt['x'], punt['y'], punt['z']), verwacht), tekst
+        getest += 1
+    assert getest > 150
+    # de volgorde van de argumenten is die van variables
+    assert Expression().fromString('x - y').compile(['y', 'x'])(1, 5) == 4
+
+def test_compile_oneindig():
+    assert AddNode(Variable('x'), Constant(float('inf'))).compile(['x'])(1) == float('inf')
+    assert SubNode(Variable('x'), Constant(float('-inf'))).compile(['x'])(1) == float('inf')
+    assert math.isnan(MulNode(Variable('x'), Constant(float('nan'))).compile(['x'])(1))
+
+def test_evaluate_array_zoals_evaluate():
+    if np is None:
+        return
+    xs = np.linspace(0.5, 1.5, 7)
+    for boom, tekst in corpus(200, seed=6):
+        tekst = drijvend(tekst)
+        if not all(stabiel(tekst, dict(punt, x=x)) for x in xs.tolist()):
+            continue
+        verwacht = [python_waarde(tekst, dict(punt, x=x)) for x in xs.tolist()]
+        with np.errstate(all='ignore'):
+            uitkomst = Expression().fromString(tekst).evaluate_array(dict(punt, x=xs))
+        assert uitkomst.shape == xs.shape, tekst
+        assert all(dichtbij(a, b) for a, b in zip(uitkomst, verwacht)), tekst
+
+def test_evaluate_array_zonder_variabelen():
+    if np is None:
+        return
+    uitkomst = Expression().fromString('3').evaluate_array({})
+    assert isinstance(uitkomst, np.ndarray) and uitkomst.dtype == float and uitkomst == 3
+    uitkomst = Expression().fromString('2 * y').evaluate_array({'x': np.zeros((2, 3)), 'y': 1})
+    assert uitkomst.shape == (2, 3) and (uitkomst == 2).all()
+
+def test_tape_zoals_python():
+    getest = 0
+    for boom, tekst in corpus(300, seed=7):
+        expressie = Expression().fromString(tekst)
+        assert expressie.to_tape().to_expression() == expressie
+        tekst = drijvend(tekst)
+        verwacht = python_waarde(tekst, punt)
+        if verwacht is None:
+            continue
+        tape = Expression().fromString(tekst).to_tape()
+        assert dichtbij(tape.evaluate(punt), verwacht), tekst
+        getest += 1
+    assert getest > 150
+    try:
+        Expression().fromString('x + y').to_tape().evaluate({'x': 1})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("geen ValueError zonder waarde voor y")
+
+def test_intern_deelt_gelijke_deelbomen():
+    for boom, tekst in corpus(200, seed=8):
+        boom = Expression().fromString(tekst)
+        a, b = intern(boom), intern(Expression().fromString(tekst))
+        assert a is b and a == boom and hash(a) == hash(boom)
+    som = intern(Expression().fromString('sin(x*y) + sin(x*y) * 2'))
+    assert som.lhs is som.rhs.lhs
+
+def test_intern_min_nul():
+    min_nul, nul = intern(Constant(-0.0)), intern(Constant(0.0))
+    assert min_nul is not nul
+    assert math.copysign(1, min_nul.value) == -1 and math.copysign(1, nul.value) == 1
+    assert str(intern(Constant(1) / Constant(-0.0))) != str(intern(Constant(1) / Constant(0.0)))
+    tape = (Variable('x') / Constant(-0.0) + Variable('x') / Constant(0.0)).to_tape()
+    assert len(tape.constanten) == 2
+
+def test_cse_zoals_evaluate():
+    gereduceerd, tijdelijk = Expression().fromString('sin(x*y) + sin(x*y)*cos(x*y)').cse()
+    assert str(gereduceerd) == '_t1 + _t1 * cos (_t0)'
+    assert [(str(a), str(b)) for a, b in tijdelijk] == [('_t0', 'x * y'), ('_t1', 'sin (_t0)')]
+    getest = 0
+    for boom, tekst in corpus(300, seed=9):
+        tekst = drijvend(tekst)
+        verwacht = python_waarde(tekst, punt)
+        if verwacht is None:
+            continue
+        gereduceerd, tijdelijk = Expression().fromString(tekst).cse()
+        assert dichtbij(evaluate_cse(gereduceerd, tijdelijk, punt).value, verwacht), tekst
+        getest += 1
+    assert getest > 150
+
+def test_evaluate_cache():
+    cache = EvaluateCache(maxsize=2)
+    expressie = Expression().fromString('x * y + 1')
+    assert cache.evaluate(expressie, {'x': 2, 'y': 3}) == Constant(7)
+    # alleen de variabelen van de expressie tellen mee in de sleutel
+    assert cache.evaluate(expressie, {'x': 2, 'y': 3, 'z': 9}) == Constant(7)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    # de oudste valt eruit als de cache vol is
+    cache.evaluate(expressie, {'x': 1, 'y': 1})
+    cache.evaluate(expressie, {'x': 0, 'y': 1})
+    assert len(cache) == 2
+    cache.evaluate(expressie, {'x': 2, 'y': 3})
+    assert cache.misses == 4
+    # waarden die niet gehasht kunnen worden gaan buiten de cache om
+    assert cache.evaluate(Variable('x'), {'x': [1, 2]}).value == [1, 2]
+    assert cache.misses == 5
+    cache.invalidate(expressie)
+    assert len(cache) == 0
+    cache.evaluate(expressie, {'x': 2, 'y': 3})
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+    assert getalwaarde(expressie, {'x': 2, 'y': 3}, cache) == 7
+
+def test_nodes_zonder_dict():
+    for node in [Constant(1), Variable('x'), NegNode(Variable('x')), SinNode(Variable('x')),
+                 AddNode(Variable('x'), Constant(1))]:
+        assert not hasattr(node, '__dict__')
+        assert not hasattr(node, 'output')
+    # fromString bewaart de RPN lijst op het object waarmee geparst wordt
+    parser = Expression()
+    parser.fromString('x + 2 * y')
+    assert [str(t) for t in parser.output] == ['x', '2', 'y', '*', '+']
+
+def test_parse_cache():
+    maxsize = parse_cache.maxsize
+    parse_cache.clear()
+    try:
+        parse_cache.maxsize = 2
+        eerste = Expression().fromString('x + 1')
+        assert (parse_cache.hits, parse_cache.misses, len(parse_cache)) == (0, 1, 1)
+        assert Expression().fromString('x + 1') is eerste
+        assert parse_cache.hits == 1
+        Expression().fromString('x + 2')
+        Expression().fromString('x + 3')
+        # de minst recent gebruikte string is eruit gevallen
+        assert len(parse_cache) == 2
+        assert Expression().fromString('x + 1') is not eerste
+        parse_cache.clear()
+        assert (parse_cache.hits, parse_cache.misses, len(parse_cache)) == (0, 0, 0)
+        # met maxsize 0 wordt er niets bewaard
+        parse_cache.maxsize = 0
+        Expression().fromString('x + 1')
+        assert len(parse_cache) == 0
+    finally:
+        parse_cache.maxsize = maxsize
+        parse_cache.clear()
+
+def test_scan():
+    tokens = scan('2.5e-3*x1 + .5E+2 - sin(1e3, y)')
+    assert [(t.soort, t.tekst) for t in tokens] == [
+        ('getal', '2.5e-3'), ('operator', '*'), ('naam', 'x1'), ('operator', '+'), ('getal', '.5E+2'),
+        ('operator', '-'), ('naam', 'sin'), ('haakje', '('), ('getal', '1e3'), ('komma', ','),
+        ('naam', 'y'), ('haakje', ')')]
+    assert [t.positie for t in tokens[:5]] == [0, 6, 7, 10, 12]
+    assert Expression().fromString('1e3 + 2.5E-1 * x').evaluate({'x': 4}) == Constant(1001.0)
+    assert tokenize('x**2') == ['x', '**', '2']
+
+def test_scan_fout_met_positie():
+    try:
+        scan('x + 2 $ y')
+    except ParseError as fout:
+        assert fout.positie == 6 and str(fout) == "onbekend teken '$' (positie 6)"
+    else:
+        raise AssertionError("geen ParseError voor $")
+
+def test_parse_zoals_fromstring():
+    for boom, tekst in corpus(500, seed=1):
+        assert str(Expression.parse(tekst)) == tekst
+        assert Expression.parse(tekst) == Expression().fromString(tekst)
+    assert str(Expression.parse('2*-4+10')) == '2 * - 4 + 10'
+    assert Expression.parse('-x**2') == NegNode(PowNode(Variable('x'), Constant(2)))
+
+# per foute formule de melding van Expression.parse
+parse_fouten = [('(x', "'(' wordt niet gesloten (positie 2)"), ('x)', "')' zonder '(' (positie 1)"),
+                ('x +', 'formule is onvolledig (positie 3)'), ('2 3', "operator verwacht voor '3' (positie 2)"),
+                ('sin x', "'(' verwacht na sin (positie 0)"), ('x , y', 'onverwachte komma (positie 2)'),
+                ('*x', "getal of variabele verwacht voor '*' (positie 0)"), ('', 'formule is onvolledig (positie 0)')]
+
+def test_parse_fouten():
+    for tekst, melding in parse_fouten:
+        try:
+            Expression.parse(tekst)
+        except ParseError as fout:
+            assert str(fout) == melding, tekst
         else:
-            tokenstring.append(c)
-    tokenstring = ''.join(tokenstring)
-    #split on spaces - this gives us our tokens
-    tokens = tokenstring.split() 
-    
-    
-    ans = []
-    for t in tokens:
-        if len(ans) > 0 and t == ans[-1] == '*':
-            ans[-1] = '**'
+            raise AssertionError("geen ParseError voor %r" % tekst)
+
+def test_parse_many():
+    regels = ['x + 1', '', '+'.join(['x'] * 5000), '(x', 'sin(x)*3']
+    for processes in (None, 2):
+        resultaten = list(parse_many(regels, processes=processes))
+        assert [r.regel for r in resultaten] == [1, 3, 4, 5]
+        assert resultaten[1].expressie == Expression.parse(regels[2])
+        assert resultaten[2].expressie is None and resultaten[2].fout == "'(' wordt niet gesloten (positie 2)"
+        assert str(resultaten[3].expressie) == 'sin (x) * 3'
+    tapes = list(parse_many(regels, tape=True))
+    assert isinstance(tapes[0].expressie, Tape)
+    # een bestandsnaam mag een str of een Path zijn
+    with tempfile.TemporaryDirectory() as map:
+        pad = pathlib.Path(map) / 'formules.txt'
+        pad.write_text('\n'.join(regels))
+        for bron in (pad, str(pad)):
+            assert [str(r.expressie) for r in parse_many(bron, chunksize=2)][:2] == ['x + 1', ' + '.join(['x'] * 5000)]
+
+def test_pratt_zoals_shunting_yard():
+    for boom, tekst in corpus(500, seed=1):
+        assert Expression.parse(tekst, 'pratt') == Expression.parse(tekst)
+    for tekst, melding in parse_fouten:
+        try:
+            Expression.parse(tekst, 'pratt')
+        except ParseError as fout:
+            assert str(fout) == melding, tekst
         else:
-            ans.append(t)
-            
-    return ans
-# check if a string represents a numeric value
-def isnumber(string):
+            raise AssertionError("geen ParseError voor %r" % tekst)
     try:
-        float(string)
-        return True
+        Expression.parse('x', 'onbekend')
     except ValueError:
-        return False
-
-# check if a string represents an integer value        
-def isint(string):
+        pass
+    else:
+        raise AssertionError("geen ValueError voor een onbekende parser")
+
+def test_pratt_diep():
+    for tekst in ['**'.join(['x'] * 3000), '(' * 2000 + 'x' + ')' * 2000, '-' * 3000 + 'x',
+                  'sin(' * 1500 + 'x' + ')' * 1500, '+'.join(['x'] * 5000)]:
+        assert Expression.parse(tekst, 'pratt') == Expression.parse(tekst)
+
+def test_dumps_en_loads():
+    for boom, tekst in corpus(200, seed=10):
+        expressie = Expression().fromString(tekst)
+        assert Expression.loads(expressie.dumps()) == expressie
+    # gehele getallen buiten 64 bits blijven exact, floats blijven floats
+    for getal in [2 ** 70, -2 ** 63 - 1, 18 ** 17, 10 ** 400, 2 ** 63 - 1, -0.0, 1e300]:
+        terug = Expression.loads(AddNode(Variable('x'), Constant(getal)).dumps()).rhs.value
+        assert terug == getal and type(terug) is type(getal) and str(terug) == str(getal)
+
+def test_afgekapte_of_beschadigde_tape():
+    data = Expression.parse('sin(x)*abc + 2.5 - 3**y + 2**80').dumps()
+    for lengte in range(len(data)):
+        try:
+            Tape.loads(data[:lengte])
+        except ValueError:
+            continue
+        raise AssertionError("geen ValueError bij lengte %d" % lengte)
+    # een onbekende opcode, een index buiten de constanten (de vijfde node is een constante,
+    # de operanden beginnen na 14 opcodes en 2 bytes opvulling) en een opcode te weinig
+    kop = tape_kop.size
+    for plek, waarde in [(kop, 99), (kop + 16 + 4 * 4, 7), (kop + 1, OP_CONST)]:
+        kapot = bytearray(data)
+        kapot[plek] = waarde
+        try:
+            Tape.loads(bytes(kapot))
+        except ValueError:
+            continue
+        raise AssertionError("geen ValueError voor byte %d = %d" % (plek, waarde))
+
+def test_expression_library():
+    expressies = [Expression().fromString(tekst) for boom, tekst in corpus(50, seed=11)]
+    with tempfile.TemporaryDirectory() as map:
+        pad = str(pathlib.Path(map) / 'formules.expl')
+        ExpressionLibrary.write(pad, expressies)
+        with ExpressionLibrary(pad) as bibliotheek:
+            assert len(bibliotheek) == 50
+            assert list(bibliotheek) == expressies
+            assert bibliotheek[-1] == expressies[-1]
+            tape = bibliotheek.tape(3)
+        # een tape die nog bestaat houdt de mmap open, close() geeft dan geen fout
+        assert tape.to_expression() == expressies[3]
+        del tape
+        data = pathlib.Path(pad).read_bytes()
+        for lengte in [0, 4, 19, len(data) - 30]:
+            pathlib.Path(pad).write_bytes(data[:lengte])
+            try:
+                ExpressionLibrary(pad)
+            except ValueError:
+                continue
+            raise AssertionError("geen ValueError bij lengte %d" % lengte)
+
+def test_incrementeel_na_set():
+    rnd = random.Random(5)
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        waarden = dict(punt)
+        inc = IncrementalEvaluator(expressie, waarden)
+        assert inc.variables() == set(expressie.variables())
+        assert dichtbij(inc.value(), expressie.evaluate(waarden).value), tekst
+        for i in range(20):
+            teken = rnd.choice('xyz')
+            waarden[teken] = rnd.uniform(0.2, 1.2) + (1.5 if teken == 'z' else 0)
+            inc.set(teken, waarden[teken])
+            assert dichtbij(inc.value(), expressie.evaluate(waarden).value), (tekst, waarden)
+    # alleen de nodes boven de veranderde variabele worden opnieuw uitgerekend
+    som = Variable('a')
+    for i in range(100):
+        som = som + Variable('x%d' % i)
+    inc = IncrementalEvaluator(som, dict({'a': 0}, **{'x%d' % i: i for i in range(100)}))
+    assert inc.value() == sum(range(100))
+    inc.set('x99', 0)
+    assert inc.value() == sum(range(99)) and inc.herberekend == 1
     try:
-        int(string)
-        return True
+        IncrementalEvaluator(Expression().fromString('x + y'), {'x': 1}).value()
     except ValueError:
-        return False
-
-class Expression():
-    #A mathematical expression, represented as an expression tree
-    
-    #Any concrete subclass of Expression should have these methods:
-    # - __str__(): return a string representation of the Expression.
-    # - __eq__(other): tree-equality, check if other represents the same expression tree.
-
-    # operator overloading:
-    # this allows us to perform 'arithmetic' with expressions, and obtain another expression
-    def __add__(self, other):
-        return AddNode(self, other)
-    
-    def __sub__(self,other):
-        return SubNode(self,other)
-        
-    def __mul__(self,other):
-        return MulNode(self,other)
-    
-    def __truediv__(self,other):
-        return DivNode(self,other)
-    
-    def __pow__(self,other):
-        return PowNode(self,other)
-    
-    def __neg__(self):
-        return NegNode(self)
-
-    # basic Shunting-yard algorithm
-    def fromString(self, string):
-        
-        # split into tokens
-        tokens = tokenize(string)
-        
-        # stack used by the Shunting-Yard algorithm
-        stack = []
-       
-        # output of the algorithm: a list representing the formula in RPN
-        # this will contain Constant's and '+'s
-        output = []
-        
-        # list of operators
-
-        oplist = ['+','-', '*', '/','**']
-        funclist = ['sin', 'cos','exp','log','tan']
-        funcuitvoer  = { 'sin' : SinNode, 'cos' : CosNode , 'exp': ExpNode, 'log': LogNode, 'tan': TanNode}
-
-        # order_op index 0 is order, index 1 is associativity (0=left, 1=right)
-        Nodes = [AddNode,SubNode,DivNode,MulNode,PowNode,NegNode]
-        
-        
-        #hier wordt een lijst gemaakt met de precedence en associativeit
-        order_op = {}
-        for node in Nodes:
-            if node == NegNode:
-                a = node(0)
-                order_op[a.op_symbol]=[a.precedence,a.associativeit]
-            else:
-                a = node(0,0)
-                order_op[a.op_symbol]=[a.precedence,a.associativeit]
-        
-        
-        
-        i = 0 
-        
-        while i< len(tokens):
-            if isnumber(tokens[i]):
-                # numbers go directly to the output
-                if isint(tokens[i]):
-                    output.append(Constant(int(tokens[i])))
-                else:
-                    output.append(Constant(float(tokens[i])))
-                    
-            elif tokens[i] in funclist:
-                #Binnen haakjes moet gezien owrden als de invoer van een functie
-                stack.append(tokens[i])
-                
-                    
-            elif tokens[i] in oplist:
-                if tokens[i] == '-' and (
-                    tokens[i-1] in oplist + ['('] or len(output)==0):  
-                    stack.append('~')    
-                else:  
-                    while True:
-                        if len(stack) == 0 or stack[-1] not in oplist+['~']:
-                            break
-                        
-                        # Shunting Yard algoritme
-                        elif (order_op[tokens[i]][1]==0 and order_op[tokens[i]][0] <= order_op[stack[-1]][0]
-                            ) or (order_op[tokens[i]][1]==1 and order_op[tokens[i]][0]<order_op[stack[-1]][0]):
-                            
-                            output.append(stack.pop())
-                        else:
-                            break
-                    stack.append(tokens[i])
-                   
-
-            elif tokens[i] == '(':
-                # left parantheses go to the stack
-                stack.append(tokens[i])
-                
-            elif tokens[i] == ')':
-                # right paranthesis: pop everything upto the last left paranthesis to the output
-                while not stack[-1] == '(':
-                    output.append(stack.pop())
-                
-                # pop the left paranthesis from the stack (but not to the output)
-                stack.pop()
-                if len(stack)> 0 and stack[-1] in funclist:
-                    output.append(stack.pop())
-                
-            else:
-                output.append(Variable(tokens[i]))
-            
-            i += 1
-        
-        # pop any tokens still on the stack to the output
-        while len(stack) > 0:
-            output.append(stack.pop())    
-        # output is the variable we use to store the RPN representation of an expression
-        self.output =output
-        # convert RPN to an actual expression tree
-        for t in output:
-            if t in oplist :
-                # let eval and operator overloading take care of figuring out what to do
-                y = stack.pop()
-                x = stack.pop()
-                stack.append(eval('x %s y' % t))
-            elif t in funclist:
-                x = stack.pop()
-                Node = funcuitvoer[t]
-                stack.append(Node(x))
-            elif t =='~':
-                y = stack.pop()
-                stack.append(NegNode(y))
-            # elif t in neglist and stack[-1] in oplist:
-                    
-            else:
-                # a constant, push it to the stack
-                stack.append(t)
-            
-                
-        # the resulting expression tree is what's left on the stack
-        return stack[0]
-
-
-# Storing constant values  
-class Constant(Expression):
-    #Represents a constant value
-    def __init__(self, value):
-        self.value = value
-        self.precedence =10
-
-    # Overload of equality sign   
-    def __eq__(self, other):
-        if isinstance(other, Constant):
-            return self.value == other.value
-        else:
-            return False
-    
-    # Overload of tostring   
-    def __str__(self):
-        return str(self.value)
-        
-    # allow conversion to int
-    def __int__(self):
-        return int(self.value)
-    
-    # allow conversion to float   
-    def __float__(self):
-        return float(self.value)
-    
-    # if evaluation is called, the constant is returned   
-    def evaluate(self,variabelen={}):
-        return self
-    
-    # returns the value without casting a specific type    
-    def constantvalue(self):
-        return self.value
-    
-    def numIntegrate(self,variabele,interval):
-        return (self.value *(interval[1] -interval[0]))
-    
-    # waarde teruggeven bij differentiatie
-    # Als leaf True is, dan moet onmiddelijk de afgeleide worden teruggegeven
-    # Als leaf false is, dan geeft hij de waarde terug en wordt hoger 
-    # in de boom bepaald wat er mee moet gebeuren
-    def dif(self,leaf=True):
-        if leaf:
-            return Constant(0)
-        else:
-            return self    
-        
-#hier defineren we de variabelen        
-class Variable(Expression):
-    
-    #initialisatie
-    def __init__(self,teken):
-        self.teken = teken
-        self.precedence = 10
-    
-    #overloaden van de tostring functie
-    def __str__(self):
-        return str(self.teken)
-    
-    #overlaoden van de equals functie
-    def __eq__(self,other):
-        if isinstance(other, Variable):
-            return self.teken == other.teken
-        else:
-            return False
-            
-    #evaluate geeft een constante waarde als x is gesubsitueerd, anders de (ongesubstitueerde) variabele zelf      
-    def evaluate(self,variabelen ={}):
-        if self.teken in variabelen:
-            return Constant(variabelen[self.teken])
-        else:
-            return self
-    
-    # waarde teruggeven bij differentiatie
-    # Als leaf is aangeroepen, dan moet de afgeleide van een niet binary worden
-    # bepaald. Dan moet direct de afgeleide worden gegeven
-    def dif(self, leaf=True):
-        if leaf:
-            return Constant(1)
-        else:
-            return self
-            
-class NegNode(Expression):
-    
-    #initialisatie van de negnode. De inwendige invoer wordt meegegeven, het teken en de precedence
-    def __init__(self, invoer):
-        self.invoer = invoer
-        self.op_symbol = '~'
-        self.precedence = 3
-
-    #printen. Indien de precedence van de invoer lager is, dan zijn er haakjes nodig
-    def __str__(self):
-        if self.invoer.precedence < self.precedence:
-            return "- (%s)" % (self.invoer)
-        else:
-            return "- %s" % (self.invoer)
-
-    #Evaluatie. Wanneer de invoer een constante is, maak dan een nieuwe constante aan
-    #Wanneer de invoer iets anders is, dan moet er een nieuwe 
-    def evaluate(self,variabelen={}):
-        getal = self.invoer.evaluate(variabelen)
-        if isinstance(getal,Constant):
-            return Constant(-getal.value)
-                #eval("%s %s %s" % (Constant(-1),'*',getal)))
-        else:
-            return NegNode(self.invoer.evaluate())
-    
-    #Differentiatie betekent dat differentiatie van expression node moet worden teruggegeven
-    def dif(self,leaf=False):
-        return NegNode(self.invoer.dif())
-    
-
-# Super classen van de functies exp, sin, cos 
-class FunctionNode(Expression):
-    
-    #Elke functie moet meekrijgen het type functie, de invoer en de operatie
-    def __init__(self, invoer ,func_symbol):
-        self.func_symbol = func_symbol
-        self.invoer = invoer
-        self.operatie = self.operatie
-        self.precedence = 10
-
-    #De printfunctie. De invoer moet altijd om haakjes worden gezet.
-    def __str__(self):
-        return "%s (%s)" % (self.func_symbol,self.invoer)
-    
-    #Eerste wordt invoer geevalueerd. Als dit geen getal oplevert dan moet 
-    #dit geevalueerd worden als een getal. Als iets anders oplevert moet de ver
-    #eenvoudigde invoer worden teruggegeven. 
-    def evaluate(self,variabelen={}):
-        evaluated = self.invoer.evaluate(variabelen)
-        if not isinstance(evaluated, Constant):
-            toreturn = copy.copy(self)
-            toreturn.invoer = evaluated
-            return self
-        else:
-            return self.operatie(evaluated)
-        
-# Een subclass van functionnode
-class SinNode(FunctionNode):
-    
-    #De operatie is sinus met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.sin
-        super(SinNode,self).__init__(invoer, 'sin')
-    
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return CosNode(self.invoer)*self.invoer.dif()
-
-# Een subclass van functionnode
-class CosNode(FunctionNode):
-    
-    #De operatie is cosinus met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.cos
-        super(CosNode,self).__init__(invoer, 'cos')
-    
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return NegNode(SinNode(self.invoer))*self.invoer.dif()  
-
-class TanNode(FunctionNode):
-
-    #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.tan
-        super(TanNode,self).__init__(invoer, 'tan')
-    
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return DivNode(Constant(1),PowNode(CosNode(self.invoer),Constant(2)))* self.invoer.dif()
-# Een subclass van functionnode
-class ExpNode(FunctionNode):
-    
-    #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.exp
-        super(ExpNode,self).__init__(invoer, 'exp')
-    
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return ExpNode(self.invoer)*self.invoer.dif() 
-
-# Een subclass van functionnode
-class LogNode(FunctionNode):
-    
-    #De operatie is exp met een maximale precendence
-    def __init__(self, invoer):
-        self.operatie =  math.log
-        super(LogNode,self).__init__(invoer, 'log')
-    
-    #Geef de afgeleide terug
-    def dif(self,leaf=False):
-        return DivNode(Constant(1),self.invoer)*self.invoer.dif()
-
-#De standaard node is een binarynode, hier zijn de meeste en meest uitgebreidde
-# functionaliteiten te vinden
-class BinaryNode(Expression):
-    
-    #A node in the expression tree representing a binary operator.
-    def __init__(self, lhs, rhs, op_symbol,precedence,commutatief):
-        self.lhs = lhs
-        self.rhs = rhs
-        self.op_symbol = op_symbol
-        self.precedence = precedence
-        self.commutatief = commutatief
-
-    #overloarden bij een gelijk teken
-    def __eq__(self, other):
-        if type(self) == type(other):
-            return self.lhs == other.lhs and self.rhs == other.rhs
-        else:
-            return False
-   
-    #overloaden van de tostring functie
-    def __str__(self):
-        uitvoer = ""
-        
-        zijde = 0 #administreer of we de linker of rechter zijde bekijken (0 = lhs)
-        #ga beide kanten langs en ga na of deze kant haakjes nodig heeft
-        
-        for side in [self.lhs, self.rhs]:
-            
-           
-            # is het een binarynode? bepaal de operatie orde een laag naar beneden en de huidige operatieorde
-            # bepaal ook of de huidige operatie commutatief is
-            if True:
-                # print(side,"zijde")
-                order_lower = side.precedence
-                order_this = self.precedence
-                this_ass =  self.commutatief
-                
-                
-                #indien ofwel orde 1 laag dieper minder groot is dan de huidige, dan zijn haakjes nodig
-                #haakjes zijn ook nodig als de huidige operatie niet commutatief is 
-                if order_lower < order_this or (not this_ass and order_lower == order_this and zijde ==1):
-                    
-                    uitvoer = uitvoer + "(%s)" % (str(side))
-                    
-                else:
-                    uitvoer = uitvoer + str(side)
-            
-            # als de huidige zijde de lhs is, dan moet het operatiesymbool worden toegevoegd    
-            if zijde == 0:
-                uitvoer = uitvoer + " %s " % (self.op_symbol)
-            
-            # een optellen om de rhs aan te duiden
-            zijde = zijde + 1
-            
-        return uitvoer
-
-    #Evaluatie functie
-    def evaluate(self, variabelen={}):
-        
-        #bepaal de waarden van lhs en de rhs, neem daarin de ingevulde variable waarden mee
-        getal1 = self.lhs.evaluate(variabelen)
-        getal2 = self.rhs.evaluate(variabelen)
-        this_symbol = self.op_symbol
-        this_order = self.precedence 
-
-        #Controleren op en verwijderen van nullen in verschillende vormen, en 
-        #gevallen iets * 1 -> iets
-        welke = 1
-
-        for getal in [getal1, getal2]:
-            #Verwijderen van nullen
-            if getal == Constant(0):
-                #Nullen in een + en - worden verwijderd
-                if this_symbol == '+':
-                    return eval("getal" + str(welke%2 + 1))
-                elif this_symbol == '-':    
-                    if welke == 1:
-                        return NegNode(getal2)
-                    else:
-                        return getal1
-                #bij * en / wordt het 0
-                elif this_symbol == '*':
-                    return Constant(0)
-                elif this_symbol == '/':
-                    if welke == 1:
-                        return Constant(0)
-                #een macht wordt 1 of 0
-                elif this_symbol == '**':
-                    if welke == 1:
-                        return Constant(0)
-                    else:
-                        return Constant(1)
-            
-            #verwijderen van enen
-            elif getal == Constant(1):
-                if this_symbol == '*':
-                    return eval("getal" + str(welke%2 + 1))
-                elif this_symbol == '/':
-                    if welke == 2:
-                        return getal1
-                elif this_symbol == '**':
-                    if welke == 1:
-                        return Constant(1)
-                    else:
-                        return getal1
-            
-            #volgende zijde
-            welke = welke + 1
-
-        #Als een van de twee géén constante is, dan is 1 van de twee ofwel een variabele, ofwel
-        #een compound expressie met een variabele er in. Dit kan dan niet als getal geevalueerd worden
-        if not isinstance(getal1,Constant):
-            return BinaryNode(getal1,getal2,this_symbol,self.precedence,self.commutatief)
-        elif not isinstance(getal2,Constant):
-            return BinaryNode(getal1,getal2,this_symbol,self.precedence,self.commutatief)
-            
-        #Wel twee constanten? Voer de operatie uit en maak een nieuwe constante aan
-        else:
-            return Constant(eval('%s %s %s' % (getal1.value, self.op_symbol, getal2.value)))
-        
-    #Differentiatie
-    def dif(self, leaf=False):
-        
-        order_this = self.precedence
-        
-        #Kettingregel. De verschillende elementen worden los van elkaar aangemaakt. Dus eerst f(x) en x'
-        # en dan het product
-        if (self.op_symbol == '**' and not (isinstance(self.lhs,Constant) or isinstance(self.lhs,Variable))):
-            macht = PowNode(self.lhs,Constant(self.rhs.value - 1))
-            product = MulNode(self.rhs,macht)
-            left = self.lhs.dif()
-            toreturn = MulNode(product,left)
-            
-        #Productregel. Analoog aan kettingregel. Eerst f'(x) en g'(x). Dan f(x)g'(x) en f'(x)g(x) en dan 
-        # de som
-        elif (self.op_symbol == '*' and not (isinstance(self.lhs,Constant) or isinstance(self.rhs,Constant))):
-            afgeleide1 = self.lhs.dif(True)
-            afgeleide2 = self.rhs.dif(True)
-            product1 = MulNode(afgeleide1,self.rhs)
-            product2 = MulNode(self.lhs,afgeleide2)
-            toreturn = AddNode(product1,product2)
-            
-        #Geen kettingregel of productregel
-        else:
-            left = self.lhs.dif(False)
-            right = self.rhs.dif(False)
-            order_this = self.precedence
-            toreturn = False   
-
-        # Nu volgt het afleiden van simpele polynomiale expressies
-        # Voor de lhs geldt:
-        if type(toreturn) == bool:
-            if isinstance(left,Constant):
-                if order_this == 1:
-                    left = Constant(0)
-                elif order_this == 2 and isinstance(right,Constant): 
-                    toreturn = Constant(0)
-                #elif right is variabele of binarynode, dan niet veranderen    
-                elif order_this == 3:
-                    #we staan geen 2^x toe op dit moment, dus is het een getal
-                    toreturn = Constant(0) 
-            elif isinstance(left,Variable):
-                if order_this == 1 or order_this == 2:
-                    #we staan nog geen productregel toe, dus rechts is een constante
-                    left = Constant(1)
-                else: #orderthis == 3
-                    macht = PowNode(left,Constant(right.value -1))
-                    toreturn = MulNode(right,macht)
-                    
-        # Voor de rhs geldt:
-        if type(toreturn) == bool:
-            if isinstance(right,Constant):
-                if order_this == 1:
-                    right = Constant(0)
-                #elif order_this == 3 of 2: dit is al gereturned of hoeft niet veranderd
-            elif isinstance(right,Variable):
-                if order_this == 1 or order_this == 2:
-                    right = Constant(1)
-                #else: #orderthis == 3 machtfunctie zijn nog niet toegestaan
-        
-        # Indien de toreturn niet al is gedefinieed
-        if type(toreturn) == bool:
-            toreturn = BinaryNode(left,right,self.op_symbol, self.precedence,self.commutatief)
-        # Eindresultaat teruggeven
-        return toreturn
-        
-        
-    
-    #Numerieke integratie
-    def numIntegrate(self,variables,intervals):
-        #voor 1 variabele
-        if isinstance(variables,str):
-            #stapgrootte vastleggen voor 1 variabele
-            steps_per_unit = 1000
-            steps1 = (intervals[1]-intervals[0])*steps_per_unit
-            begin1 = intervals[0]
-            eind1 = intervals[1]
-            ans = 0
-            
-            #trapeziummethode toepassen op alle stapjes
-            for i in range(0,steps1):
-                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                for xpunt in x:
-                    f = self.evaluate({variables:xpunt})
-                    ans += (1/2)*eval('%s' % f)/steps_per_unit
-            
-            return round(ans,3)
-        
-        #voor 1 variabele voor het geval dat deze in een lijst staat
-        elif (isinstance(variables,list) and len(variables)==1):
-            #stapgrootte vastleggen voor 1 variabele
-            steps_per_unit = 1000
-            steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-            begin1 = intervals[0][0]
-            eind1 = intervals[0][1]
-            ans = 0
-            
-            #trapeziummethode toepassen op alle stapjes
-            for i in range(0,steps1):
-                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                for xpunt in x:
-                    f = self.evaluate({variables[0]:xpunt})
-                    ans += (1/2)*eval('%s' % f)/steps_per_unit
-            
-            return round(ans,3)
-        
-        #voor meerdere variabelen
-        else:
-            #testen of er een of meerdere getallen in intervals zitten
-            test = []
-            for i in intervals:
-                test.append(isinstance(i,list))
-            if all(test)==False:
-                newfunction = self
-                newvariables = variables
-                newintervals = intervals
-                correction = 0
-                number = 0
-                #nieuwe functie, variabelen en intervallen maken
-                for j in intervals:
-                    if (isinstance(j,int) or isinstance(j,float)):
-                        newfunction = newfunction.evaluate({variables[number]:j})
-                        newvariables.pop(number)
-                        newintervals.pop(number)
-                        correction += 1
-                    number += 1
-                #de functie numIntegrate opnieuw runnen voor de nieuwe functie
-                return newfunction.numIntegrate(newvariables,newintervals)
-            
-            #integratie starten voor meerdere variabelen
+        pass
+    else:
+        raise AssertionError("geen ValueError zonder waarde voor y")
+
+def test_variables_en_vouwen():
+    expressie = Expression().fromString('a*x + sin(y)*z')
+    assert expressie.variables() == frozenset('axyz')
+    deels = expressie.evaluate({'a': 2})
+    # de deelboom zonder a komt ongewijzigd terug
+    assert str(deels) == '2 * x + sin (y) * z' and deels.rhs is expressie.rhs
+    # maar constanten worden nog steeds gevouwen
+    assert str(Expression().fromString('a*x + 2*3*x').evaluate({'a': 1.5})) == '1.5 * x + 6 * x'
+    assert str(Expression().fromString('x*1+0*y').evaluate({'x': 2})) == '2'
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    # b was het langst niet gebruikt
+    assert cache.get('b') is None and len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+    # sleutels die niet gehasht kunnen worden gaan erbuiten om
+    cache.put(['d'], 4)
+    assert cache.get(['d']) is None and len(cache) == 2
+    node = Variable('x')
+    cache.put_node(node, 'sleutel', 5)
+    assert cache.get_node(node, 'sleutel') == 5 and cache.get_node(Variable('x'), 'sleutel') is None
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+    onbegrensd = LRUCache(maxsize=None)
+    for i in range(5000):
+        onbegrensd.put(i, i)
+    assert len(onbegrensd) == 5000
+
+def test_specialize():
+    expressie = Expression().fromString('2*x*a + a*a*x + sin(b)*a*x + y')
+    functie = expressie.specialize({'a': 3, 'b': 0.5}, free=['y', 'x'])
+    assert functie(1, 2) == expressie.evaluate({'a': 3, 'b': 0.5, 'x': 2, 'y': 1}).value
+    # alle constanten zijn gevouwen voor het compileren
+    assert functie.__doc__ == '%r * x + y' % (6 + 9 + math.sin(0.5) * 3)
+    assert expressie.specialize({'a': 3, 'b': 0.5, 'q': 1}, free=['y', 'x']) is functie
+    assert expressie.specialize({'a': 3.0, 'b': 0.5}, free=['y', 'x']) is not functie
+    assert expressie.specialize({'a': 1, 'b': 0}).__doc__ == '3 * x + y'
+    try:
+        expressie.specialize({'a': 3}, free=['x'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("geen ValueError voor b en y zonder waarde")
+
+def test_gradient_zoals_differentie():
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        gradient = expressie.gradient(punt)
+        assert set(gradient) == set(expressie.variables())
+        for teken in expressie.variables():
+            f = lambda t: expressie.evaluate(dict(punt, **{teken: t})).value
+            assert dichtbij(gradient[teken], differentie(f, punt[teken]), rtol=1e-5, atol=1e-6), (tekst, teken)
+    # een deelboom die vaker voorkomt telt even vaak mee
+    assert intern(Expression().fromString('x*x + x*x')).gradient({'x': 3}) == {'x': 12}
+
+def test_value_and_derivative():
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        for teken in expressie.variables():
+            f = lambda t: expressie.evaluate(dict(punt, **{teken: t})).value
+            waarde, afgeleide = expressie.value_and_derivative(teken, punt)
+            assert dichtbij(waarde, f(punt[teken])), tekst
+            assert dichtbij(afgeleide, differentie(f, punt[teken]), rtol=1e-5, atol=1e-6), (tekst, teken)
+    assert Expression.parse('3 * y').value_and_derivative('x', {'y': 2}) == (6, 0)
+    assert Expression.parse('x ** 0').value_and_derivative('x', {'x': 0}) == (1, 0)
+
+def test_value_and_derivative_array():
+    if np is None:
+        return
+    xs = np.array([0.5, 1.5, 2.0])
+    ys = np.array([1.0, 2.0, 3.0])
+    # de array die niet gedifferentieerd wordt staat links van de bewerking
+    for tekst in ['x*y', 'x+y', 'x-y', 'x/y', 'sin(x)*y', 'x**y', 'y**x', 'exp(x)/y - 3']:
+        expressie = Expression.parse(tekst)
+        for teken in ['x', 'y']:
+            waarde, afgeleide = expressie.value_and_derivative_array(teken, {'x': xs, 'y': ys})
+            assert waarde.shape == afgeleide.shape == xs.shape, tekst
+            for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+                verwacht = expressie.value_and_derivative(teken, {'x': x, 'y': y})
+                assert dichtbij(waarde[i], verwacht[0]) and dichtbij(afgeleide[i], verwacht[1]), (tekst, teken)
+    waarde, afgeleide = Expression.parse('2 * y').value_and_derivative_array('x', {'x': xs, 'y': 1})
+    assert waarde.shape == afgeleide.shape == xs.shape and (waarde == 2).all() and (afgeleide == 0).all()
+
+def test_simplify():
+    for tekst, verwacht in [('1 + x + 18', '19 + x'), ('x*2*x/4', 'x ** 2 / 2'),
+                            ('2*x - x/2', '3 * x / 2'), ('x - x', '0'), ('- - x ** 1', 'x')]:
+        assert str(Expression.parse(tekst).simplify()) == verwacht, tekst
+    # log krijgt de regel en het aantal nodes van de hele expressie voor en na
+    meldingen = []
+    uitkomst = Expression.parse('sin(0) + y*1').simplify(log=lambda *melding: meldingen.append(melding))
+    assert str(uitkomst) == 'y'
+    assert meldingen == [('constanten', 6, 5), ('factoren', 5, 3), ('termen', 3, 1)]
+
+def test_simplify_zoals_python():
+    for boom, tekst in corpus(300, seed=11):
+        tekst = drijvend(tekst)
+        if not stabiel(tekst, punt):
+            continue
+        expressie = Expression().fromString(tekst)
+        vereenvoudigd = expressie.simplify()
+        assert aantal_nodes(vereenvoudigd) <= aantal_nodes(expressie), tekst
+        assert dichtbij(vereenvoudigd.evaluate(punt).value, python_waarde(tekst, punt), rtol=1e-6, atol=1e-8), tekst
+
+def test_simplify_lange_som():
+    # alleen de bovenste + van de ketting verzamelt, anders wordt dit kwadratisch
+    tekst = ' + '.join('%d*x%d' % (i % 7 + 1, i) for i in range(3000)) + ' + 3 - x1'
+    vereenvoudigd = Expression.parse(tekst).simplify()
+    assert str(vereenvoudigd).startswith('3 + x0 + x1 + 3 * x2 + ')
+    assert str(vereenvoudigd).endswith(' + 3 * x2998 + 4 * x2999')
+
+def test_derivative_zoals_differentie():
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        for teken in sorted(expressie.variables()):
+            f = lambda t: expressie.evaluate(dict(punt, **{teken: t})).value
+            eerste = expressie.derivative(teken)
+            assert dichtbij(eerste.evaluate(punt).value, differentie(f, punt[teken]), rtol=1e-5, atol=1e-6), (tekst, teken)
+            g = lambda t: eerste.evaluate(dict(punt, **{teken: t})).value
+            tweede = expressie.derivative(teken, order=2)
+            assert dichtbij(tweede.evaluate(punt).value, differentie(g, punt[teken]), rtol=1e-5, atol=1e-6), (tekst, teken)
+    assert str(Expression.parse('3 * y').derivative('x').evaluate({})) == '0'
+
+def test_derivative_deelt_deelbomen():
+    # zonder delen verdubbelt elke afgeleide van een product de boom
+    expressie = Expression.parse('sin(x) * exp(x) * x')
+    afgeleide = expressie.derivative('x', order=12)
+    verschillend = set()
+    postorder(afgeleide, lambda node, kinderen: verschillend.add(id(node)))
+    assert len(verschillend) < 200 and aantal_nodes(afgeleide) > 100000
+    # de tiende afgeleide van x * exp(x) is (x + 10) * exp(x)
+    tiende = Expression.parse('x * exp(x)').derivative('x', order=10)
+    assert dichtbij(tiende.evaluate({'x': 0.5}).value, 10.5 * math.exp(0.5))
+
+def test_hessian():
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        tekens = sorted(expressie.variables())
+        matrix = expressie.hessian(tekens)
+        for i, rij in enumerate(tekens):
+            for j, kolom in enumerate(tekens):
+                # symmetrisch, en de twee helften zijn dezelfde node
+                assert matrix[i][j] is matrix[j][i]
+                g = lambda t: expressie.derivative(rij).evaluate(dict(punt, **{kolom: t})).value
+                assert dichtbij(matrix[i][j].evaluate(punt).value, differentie(g, punt[kolom]),
+                                rtol=1e-5, atol=1e-6), (tekst, rij, kolom)
+
+def test_hvp():
+    richting = {'x': 0.3, 'y': -1.1, 'z': 2.0}
+    for tekst in formules:
+        expressie = Expression().fromString(tekst)
+        tekens = sorted(expressie.variables())
+        matrix = expressie.hessian(tekens)
+        uitkomst = expressie.hvp(punt, richting)
+        for i, rij in enumerate(tekens):
+            verwacht = sum(matrix[i][j].evaluate(punt).value * richting[kolom] for j, kolom in enumerate(tekens))
+            assert dichtbij(uitkomst[rij], verwacht, rtol=1e-9), (tekst, rij)
+    # een variabele zonder richting telt als richting 0
+    assert Expression.parse('x * x * y').hvp({'x': 2, 'y': 3}, {'x': 1}) == {'x': 6, 'y': 4}
+
+def test_jvp_en_vjp():
+    expressies = [Expression().fromString(tekst) for tekst in formules]
+    gradienten = [expressie.gradient(punt) for expressie in expressies]
+    richting = {'x': 0.3, 'y': -1.1, 'z': 2.0}
+    uitkomst = jvp(expressies, punt, richting)
+    assert len(uitkomst) == len(expressies)
+    for waarde, gradient in zip(uitkomst, gradienten):
+        assert dichtbij(waarde, sum(gradient[teken] * richting[teken] for teken in gradient))
+    gewichten = [1.5, -2, 0.25, 1, 3, -0.5, 2]
+    uitkomst = vjp(expressies, punt, gewichten)
+    for teken in punt:
+        assert dichtbij(uitkomst[teken], sum(gewicht * gradient.get(teken, 0)
+                                             for gewicht, gradient in zip(gewichten, gradienten))), teken
+    # een deelboom die in beide expressies voorkomt
+    eerste, tweede = intern(Expression.parse('sin(x) * y + x')), intern(Expression.parse('3 * (sin(x) * y)'))
+    assert jvp([eerste, tweede], {'x': 1, 'y': 2}, {'y': 1}) == [math.sin(1), 3 * math.sin(1)]
+    uitkomst = vjp([eerste, tweede], {'x': 1, 'y': 2}, [1, 1])
+    assert dichtbij(uitkomst['x'], 1 + 4 * 2 * math.cos(1)) and dichtbij(uitkomst['y'], 4 * math.sin(1))
+    # elke variabele moet een waarde hebben
+    try:
+        jvp([eerste], {'x': 1}, {'x': 1})
+        assert False
+    except ValueError:
+        pass
+
+def test_integrate():
+    for tekst, interval, verwacht in [('sin(x)', [0, math.pi], 2.0), ('exp(-x*x)', [-6, 6], math.sqrt(math.pi)),
+                                      ('1 / x', [1, 10], math.log(10)), ('x ** 0.5', [0, 1], 2 / 3),
+                                      ('x * x', [2, 0], -8 / 3), ('sin(10 * x) ** 2', [0, 5.5], 2.75 - math.sin(110) / 40)]:
+        waarde, fout = Expression().fromString(tekst).integrate('x', interval)
+        assert abs(waarde - verwacht) <= 1e-9 * max(1, abs(verwacht)), tekst
+        assert fout <= 1e-9 * max(1, abs(verwacht)), tekst
+    # met weinig evaluaties stopt hij eerder en is de foutschatting groter
+    waarde, fout = Expression.parse('x ** 0.5').integrate('x', [0, 1], max_evaluaties=45)
+    assert fout > 1e-10 and abs(waarde - 2 / 3) <= fout
+    assert Expression.parse('3').integrate('x', [1, 4]) == (9, 0.0)
+    assert Expression.parse('2 * x').numIntegrate('x', [0, 3]) == Expression.parse('2 * x').integrate('x', [0, 3])[0]
+    try:
+        Expression.parse('x * y').integrate('x', [0, 1])
+        assert False
+    except ValueError as fout:
+        assert 'y' in str(fout)
+
+def test_grid_integrate():
+    import expression
+    # Simpson is exact voor een derde graads polynoom, de trapeziumregel zit er bij x * x (b-a) * h**2 / 6 naast
+    assert dichtbij(Expression.parse('x ** 3 + x').gridIntegrate('x', [0, 2], stappen=4), 6)
+    assert dichtbij(Expression.parse('x * x').gridIntegrate('x', [0, 1], stappen=10, regel='trapezium'), 1 / 3 + 1 / 600)
+    # een oneven aantal stappen wordt voor Simpson even gemaakt
+    assert dichtbij(Expression.parse('x ** 3').gridIntegrate('x', [0, 1], stappen=3), 1 / 4)
+    drie = Expression.parse('x * y * z + sin(z)')
+    verwacht = 2 * 3 ** 2 / 2 * 0.5 + 6 * (1 - math.cos(1))
+    assert dichtbij(drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], [0, 3], [0, 1]], stappen=[2, 2, 200]), verwacht, rtol=1e-9)
+    # een getal zet de variabele vast
+    assert dichtbij(drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], 1.5, [0, 1]], stappen=[2, 200]),
+                    1.5 + 2 * (1 - math.cos(1)), rtol=1e-9)
+    assert dichtbij(drie.numIntegrate(['x', 'y', 'z'], [[0, 2], [0, 3], [0, 1]]), verwacht, rtol=1e-8)
+    # zonder numpy wordt elk punt met een gecompileerde functie uitgerekend, met dezelfde uitkomst
+    oud = expression.np
+    expression.np = None
+    try:
+        zonder = drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], [0, 3], [0, 1]], stappen=[2, 4, 20])
+        zonder_trapezium = drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], 1.5, [0, 1]], stappen=10, regel='trapezium')
+    finally:
+        expression.np = oud
+    assert dichtbij(zonder, drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], [0, 3], [0, 1]], stappen=[2, 4, 20]))
+    if np is not None:
+        assert dichtbij(zonder_trapezium, drie.gridIntegrate(['x', 'y', 'z'], [[0, 2], 1.5, [0, 1]], stappen=10, regel='trapezium'))
+    for variabelen, intervallen, regel in [(['x', 'z'], [[0, 1], [0, 1]], 'simpson'), (['x', 'y', 'z'], [[0, 1]] * 3, 'midden')]:
+        try:
+            drie.gridIntegrate(variabelen, intervallen, regel=regel)
+            assert False
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    fouten = 0
+    for naam, test in sorted(globals().items()):
+        if naam.startswith('test_'):
+            try:
+                test()
+            except AssertionError as fout:
+                fouten += 1
+                print('%s: FOUT %s' % (naam, fout))
             else:
-                #integratie voor twee variabelen
-                if len(variables)==2:
-                    #stapgrootte vastleggen voor 2 variabele
-                    steps_per_unit = 100
-                    
-                    steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-                    begin1 = intervals[0][0]
-                    eind1 = intervals[0][1]
-                    
-                    steps2 = (intervals[1][1]-intervals[1][0])*steps_per_unit
-                    begin2 = intervals[1][0]
-                    eind2 = intervals[1][1]
-                    
-                    ans = 0
-                    #trapeziummethode toepassen op alle stapjes
-                    for i in range(0,steps1):
-                        for j in range(0,steps2):
-                            x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                            y = [begin2+(j*(eind2-begin2))/steps2, begin2+((j+1)*(eind2-begin2))/steps2]
-                            for xpunt in x:
-                                for ypunt in y:
-                                    f = self.evaluate({variables[0]:xpunt,variables[1]:ypunt})
-                                    ans += (1/4)*eval('%s' % f)/(steps_per_unit**2)
-                    
-                    return round(ans,3)
-                
-                #integratie voor drie variabelen
-                elif len(variables)==3:
-                    #stapgrootte vastleggen voor 3 variabele
-                    steps_per_unit = 10
-                    
-                    steps1 = (intervals[0][1]-intervals[0][0])*steps_per_unit
-                    begin1 = intervals[0][0]
-                    eind1 = intervals[0][1]
-                    
-                    steps2 = (intervals[1][1]-intervals[1][0])*steps_per_unit
-                    begin2 = intervals[1][0]
-                    eind2 = intervals[1][1]
-                    
-                    steps3 = (intervals[2][1]-intervals[2][0])*steps_per_unit
-                    begin3 = intervals[2][0]
-                    eind3 = intervals[2][1]
-                    
-                    ans = 0
-                    #trapeziummethode toepassen op alle stapjes
-                    for i in range(0,steps1):
-                        for j in range(0,steps2):
-                            for k in range(0,steps3):
-                                x = [begin1+(i*(eind1-begin1))/steps1, begin1+((i+1)*(eind1-begin1))/steps1]
-                                y = [begin2+(j*(eind2-begin2))/steps2, begin2+((j+1)*(eind2-begin2))/steps2]
-                                z = [begin3+(k*(eind3-begin3))/steps3, begin3+((k+1)*(eind3-begin3))/steps3]
-                                for xpunt in x:
-                                    for ypunt in y:
-                                        for zpunt in z:
-                                            f = self.evaluate({variables[0]:xpunt,variables[1]:ypunt,variables[2]:zpunt})
-                                            ans += (1/8)*eval('%s' % f)/(steps_per_unit**3)
-                    
-                    return round(ans,3)
-        
-        return round(ans,3)
-    
-    #Nulpunt vinden op gespecificeerd interval
-    def findRoot(self,expression,variable,interval):
-        if expression.evaluate({variable:interval[0]}).value<expression.evaluate({variable:interval[1]}).value:
-            a = interval[0]
-            b = interval[1]
-        else:
-            a = interval[1]
-            b = interval[0]
-        
-        m = (a+b)/2
-        delta = 0.0001
-        
-        if abs(b-a)<=delta:
-            return m
-        
-        if expression.evaluate({variable:m}).value<=0:
-            newinterval = [m,b]
-            return self.findRoot(expression,variable,newinterval)
-        else:
-            newinterval = [a,m]
-            return self.findRoot(expression,variable,newinterval)
-    
-    #Numeriek vergelijkingen oplossen
-    def numSolver(self,left,right,variable,interval):
-        epsilon = 0.01
-        solutions = []
-        nulexpression = SubNode(left, right) #KOEN WERKT DIT WANT WAT ER STOND ER NIET
-        i = interval[0]
-        while i+epsilon<=interval[1]:
-            if (nulexpression.evaluate({variable:i}).value<=0 and nulexpression.evaluate({variable:i+epsilon}).value>=0) or (nulexpression.evaluate({variable:i}).value>=0 and nulexpression.evaluate({variable:i+epsilon}).value<=0):
-                nul = self.findRoot(nulexpression,variable,[i,i+epsilon])
-                solutions.append(nul)
-            i += epsilon
-        return solutions
-
-
-#overloaden van operaties        
-class AddNode(BinaryNode):
-    """Represents the addition operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 1 #meegeven van de precendence en associativiteit
-        self.commutatief = True
-        self.op_symbol = '+'
-        self.associativiteit = 0
-        super(AddNode, self).__init__(lhs, rhs,self.op_symbol,self.precedence,self.commutatief)
-    
-    
-#onderstaande functies zijn extra maar analoog aan addnode
-class SubNode(BinaryNode):
-    """Represents the subtraction operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 1
-        self.commutatief = False
-        self.op_symbol = '-'
-        self.associativiteit = 0
-        super(SubNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
-        
-
-class DivNode(BinaryNode):
-    """Represents the division operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 2
-        self.commutatief = False
-        self.op_symbol = '/'
-        self.associativiteit = 0
-        super(DivNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
-
-class MulNode(BinaryNode):
-    """Represents the multiplication operator"""
-
-    def __init__(self, lhs, rhs):
-        self.precedence = 2
-        self.commutatief = True
-        self.op_symbol = '*'
-        self.associativiteit = 0
-        super(MulNode, self).__init__(lhs, rhs ,self.op_symbol,self.precedence,self.commutatief)
-
-class PowNode(BinaryNode):
-    """Represents the power operator"""
-    
-    def __init__(self, lhs, rhs):
-        self.precedence = 3
-        self.commutatief = False
-        self.op_symbol = '**'
-        self.associativiteit = 1
-        super(PowNode, self).__init__(lhs, rhs , self.op_symbol,self.precedence,self.commutatief)
\ No newline at end of file
+                print('%s: goed' % naam)
+    sys.exit(1 if fouten else 0)